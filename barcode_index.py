@@ -0,0 +1,171 @@
+#MEMORY-MAPPED BARCODE INDEX
+#
+# A read-only, sorted lookup file of barcode -> product name:
+#
+#   MAGIC, count (uint64), key width (uint64)
+#   count keys, each UTF-8 and NUL-padded to the key width, in byte order
+#   count+1 uint64 offsets into the names
+#   the names (UTF-8) back to back
+#
+# All integers are little-endian. Lookups binary-search the keys straight out of
+# a memory map, so every process that opens the file shares one copy of it
+# through the page cache and nothing is loaded up front.
+#
+# Keys are compared byte for byte, both when written and when looked up (see
+# _key_bytes). For canonical GTIN-14 numbers (a BIGINT code column) that is the
+# same match the database makes; text keys must match exactly, where a VARCHAR
+# column's collation would also ignore case and trailing spaces.
+import mmap
+import os
+import struct
+import tempfile
+
+MAGIC = b"YCPBIDX1"
+_HEADER = struct.Struct("<QQ")
+_OFFSET = struct.Struct("<Q")
+
+# the bytes a barcode is stored and searched under: its text, as UTF-8
+def _key_bytes(code):
+  return code if isinstance(code, bytes) else str(code).encode('utf-8')
+
+def write_index(filename, rows, key_width):
+  """
+  Writes an index from (barcode, name) rows, which must be sorted by the
+  barcode's UTF-8 bytes (ORDER BY BINARY code). Rows with no name are left out,
+  since a lookup that finds no name is answered the same as a missing barcode.
+  The file is replaced atomically, so processes still reading the old one keep
+  a valid map of it.
+
+  Args:
+      filename (str): The index file to create.
+      rows (iterable): (barcode, name) pairs, sorted by barcode.
+      key_width (int): Bytes reserved per barcode; at least the longest one.
+
+  Returns:
+      int: The number of barcodes written.
+
+  Raises:
+      ValueError: If the rows are not sorted, repeat a barcode or one is wider than key_width.
+  """
+  key_width = max(key_width, 1)
+  directory = os.path.dirname(os.path.abspath(filename))
+  count = 0
+  offsets = [0]
+  fd, tmp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+  try:
+    with os.fdopen(fd, 'wb') as index_file, tempfile.TemporaryFile(dir=directory) as names:
+      index_file.write(MAGIC)
+      index_file.write(_HEADER.pack(0, key_width))
+      previous = None
+      for code, name in rows:
+        if code is None or name is None:
+          continue
+        key = _key_bytes(code)
+        if len(key) > key_width:
+          raise ValueError(f"barcode {code!r} is wider than the index key width {key_width}")
+        key = key.ljust(key_width, b'\0')
+        if previous is not None and key <= previous:
+          raise ValueError(f"barcodes must be unique and sorted by their bytes; {code!r} is out of order")
+        previous = key
+        index_file.write(key)
+        name = name if isinstance(name, bytes) else str(name).encode('utf-8')
+        names.write(name)
+        offsets.append(offsets[-1] + len(name))
+        count += 1
+
+      for offset in offsets:
+        index_file.write(_OFFSET.pack(offset))
+      names.seek(0)
+      while True:
+        chunk = names.read(1024 * 1024)
+        if not chunk:
+          break
+        index_file.write(chunk)
+      index_file.seek(len(MAGIC))
+      index_file.write(_HEADER.pack(count, key_width))
+    os.replace(tmp_filename, filename)
+  except BaseException:
+    os.remove(tmp_filename)
+    raise
+  return count
+
+class BarcodeIndex():
+  def __init__(self, filename):
+    """
+    Opens an index written by write_index through a read-only memory map.
+
+    Raises:
+        ValueError: If the file is not a barcode index.
+    """
+    self.filename = filename
+    self.file = open(filename, 'rb')
+    try:
+      self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      self.file.close()
+      raise ValueError(f"'{filename}' is empty, not a barcode index")
+    header_end = len(MAGIC) + _HEADER.size
+    if len(self.map) < header_end or self.map[:len(MAGIC)] != MAGIC:
+      self.close()
+      raise ValueError(f"'{filename}' is not a barcode index")
+    self.count, self.key_width = _HEADER.unpack_from(self.map, len(MAGIC))
+    self._keys_start = header_end
+    self._offsets_start = self._keys_start + self.count * self.key_width
+    self._names_start = self._offsets_start + (self.count + 1) * _OFFSET.size
+
+  def __len__(self):
+    return self.count
+
+  # position of the barcode among the keys, or -1
+  def _find(self, code):
+    key = _key_bytes(code)
+    if len(key) > self.key_width:
+      return -1
+    key = key.ljust(self.key_width, b'\0')
+    low, high = 0, self.count
+    while low < high:
+      mid = (low + high) // 2
+      start = self._keys_start + mid * self.key_width
+      probe = self.map[start:start + self.key_width]
+      if probe < key:
+        low = mid + 1
+      elif probe > key:
+        high = mid
+      else:
+        return mid
+    return -1
+
+  def get(self, code):
+    """
+    Returns:
+        str: The product name for the barcode, or None if it isn't indexed.
+    """
+    if code is None:
+      return None
+    position = self._find(code)
+    if position < 0:
+      return None
+    start, end = struct.unpack_from("<QQ", self.map, self._offsets_start + position * _OFFSET.size)
+    return self.map[self._names_start + start:self._names_start + end].decode('utf-8')
+
+  def get_many(self, codes):
+    """
+    Returns:
+        dict: Maps each indexed barcode in 'codes' to its name, like SQLInterface.query_many.
+    """
+    names = {}
+    for code in codes:
+      name = self.get(code)
+      if name is not None:
+        names[code] = name
+    return names
+
+  def close(self):
+    self.map.close()
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    self.close()
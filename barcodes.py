@@ -0,0 +1,68 @@
+#BARCODE CANONICALIZATION
+#
+# EAN-8, UPC-A, EAN-13 and GTIN-14 are all the same number space once padded to
+# 14 digits: "036000291452" (UPC-A), "0036000291452" (EAN-13) and
+# "00036000291452" are one product. Storing that number as a BIGINT makes those
+# spellings the same key and keeps the indexes a fraction of the VARCHAR size.
+
+# digits accepted: EAN-8 up to GTIN-14, including codes whose leading zeros a scanner dropped
+_MIN_DIGITS = 8
+_MAX_DIGITS = 14
+
+def gtin_check_digit(body):
+  """
+  Returns:
+      int: The GS1 check digit for a string of digits (the code without its
+           last digit). Weights alternate 3, 1 from the right, so leading
+           zeros don't change it.
+  """
+  total = 0
+  for position, digit in enumerate(reversed(body)):
+    total += int(digit) * (3 if position % 2 == 0 else 1)
+  return (10 - total % 10) % 10
+
+def canonical_gtin(code):
+  """
+  Validates a scanned or stored barcode and returns its GTIN-14 value.
+
+  Args:
+      code (str or int): The barcode. Surrounding whitespace is ignored.
+
+  Returns:
+      int: The code as a GTIN-14 number (the BIGINT key), or None if it is
+           not 8-14 digits or its check digit is wrong.
+  """
+  if isinstance(code, bool):
+    return None
+  if isinstance(code, int):
+    if code <= 0:
+      return None
+    digits = str(code)
+  elif isinstance(code, (str, bytes, bytearray)):
+    digits = code.decode('ascii', errors='replace') if not isinstance(code, str) else code
+    digits = digits.strip()
+    if not digits.isascii() or not digits.isdigit() or len(digits) < _MIN_DIGITS:
+      return None
+  else:
+    return None
+
+  if len(digits) > _MAX_DIGITS or gtin_check_digit(digits[:-1]) != int(digits[-1]):
+    return None
+  return int(digits)
+
+def gtin_text(key):
+  """
+  Returns:
+      str: A GTIN-14 key written out as a barcode for API replies: 13 digits
+           (the EAN-13 form, so "0028400020008" comes back as sent) unless
+           its indicator digit makes it a 14-digit GTIN. Codes stored from
+           8- or 12-digit scans are also padded to 13.
+  """
+  return f"{key:013d}"
+
+def is_barcode_type(col_type):
+  """
+  Returns:
+      bool: Whether a MySQL column type holds canonical barcode keys (BIGINT).
+  """
+  return col_type.strip().upper().startswith('BIGINT')
@@ -0,0 +1,330 @@
+#BENCHMARKS
+#
+# python benchmark.py prepared [lookups]
+#   times "covered?"-style lookups (one store table, then eanref) over the text
+#   protocol and as prepared statements, against the database configured in server.py
+#
+# python benchmark.py suite [--rows N] [--stores N] [--store-rows N] [--requests N]
+#                           [--clients N] [--lookups N] [--page N] [--mysql] [--json FILE]
+#   fills synthetic eanref and store_<id> tables (10k to 10M rows) in the SQLite
+#   stand-in, or with --mysql in the BENCH_DB_NAME database of the server
+#   configured in server.py, then times the imports, export_table, find_row_index
+#   and the covered? / get_appr requests through the Flask test client, from one
+#   client and from --clients at once. Every line gives throughput, p50/p99
+#   latency and the process's peak RSS so far; --json saves the same figures so
+#   runs can be compared.
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from barcodes import gtin_check_digit
+from sql_interface import SQLInterface
+from sqlite_interface import SQLiteInterface
+from server import (Server, DB_HOST, DB_NAME, DB_USERNAME, DB_PASSWORD, DB_PREPARED_STATEMENTS,
+                    APPROVED_DB_COLUMN_NAMES, STORE_DB_COLUMN_NAMES)
+
+# the database the suite fills on a MySQL server; its tables are dropped, so never the live one
+BENCH_DB_NAME = "ycp_benchmark"
+
+# as main.py imports the Open Food Facts dump
+EANREF_COLUMNS = {
+  'code': 'BIGINT PRIMARY KEY',
+  'product_name': 'MEDIUMTEXT'
+}
+
+# percentile of an already sorted list of samples
+def percentile(samples, fraction):
+  if not samples:
+    return 0.0
+  return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+# time fn(code) for every code; returns per-call latencies in seconds, sorted
+def time_calls(fn, codes):
+  latencies = []
+  for code in codes:
+    start = time.perf_counter()
+    fn(code)
+    latencies.append(time.perf_counter() - start)
+  latencies.sort()
+  return latencies
+
+# the process's peak resident set size so far in MiB, or None without the
+# resource module (Windows). The database server's memory is not included.
+def peak_rss_mb():
+  try:
+    import resource
+  except ImportError:
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024 # bytes on macOS, KiB elsewhere
+
+def _print_result(result):
+  def micros(seconds):
+    return f"{seconds * 1e6:>8.1f}us" if seconds is not None else f"{'-':>10}"
+  rss = result["peak_rss_mb"]
+  print(f"{result['label']:<20} {result['count']:>9} {result['unit']:<5} {result['per_second']:>10.0f}/s  "
+        f"p50 {micros(result['p50'])}  p99 {micros(result['p99'])}  "
+        f"rss {f'{rss:.0f}MiB' if rss is not None else 'n/a'}")
+
+def report(label, latencies, wall=None):
+  """
+  Prints throughput and latency for a set of timed calls.
+
+  Args:
+      label (str): What was timed.
+      latencies (list): Per-call seconds, sorted.
+      wall (float, optional): Elapsed seconds when the calls overlapped, which
+                              throughput is then measured against instead of
+                              the summed latencies. Defaults to None.
+
+  Returns:
+      dict: The figures printed.
+  """
+  total = wall if wall is not None else sum(latencies)
+  result = {"label": label, "count": len(latencies), "unit": "calls",
+            "per_second": len(latencies) / total if total else 0.0,
+            "p50": percentile(latencies, 0.50), "p99": percentile(latencies, 0.99), "peak_rss_mb": peak_rss_mb()}
+  _print_result(result)
+  return result
+
+def report_bulk(label, rows, seconds):
+  """
+  Prints the row rate of a one-shot operation (an import or export).
+
+  Returns:
+      dict: The figures printed, in the same shape as report()'s.
+  """
+  result = {"label": label, "count": rows, "unit": "rows", "per_second": rows / seconds if seconds else 0.0,
+            "p50": None, "p99": None, "seconds": seconds, "peak_rss_mb": peak_rss_mb()}
+  _print_result(result)
+  return result
+
+def bench_prepared(lookups=20000, storeid="0"):
+  """
+  Runs the covered? lookup path (the store table, then eanref on a miss) for
+  'lookups' barcodes sampled from eanref, once over the text protocol and once
+  with prepared statements, and prints throughput and latency for each.
+  """
+  interfaces = {
+    "text": SQLInterface(DB_HOST, DB_NAME, DB_USERNAME, DB_PASSWORD),
+    "prepared": SQLInterface(DB_HOST, DB_NAME, DB_USERNAME, DB_PASSWORD, prepared_statements=True)
+  }
+  for dbase in interfaces.values():
+    dbase.connect()
+
+  sampler = interfaces["prepared"]
+  sampler.prepare_statement("sample_codes", "SELECT code FROM eanref LIMIT %s")
+  codes = [row[0] for row in sampler.execute_statement("sample_codes", (lookups,)) or []]
+  if not codes:
+    print("eanref is empty; fill it with main.py first.")
+    return
+  codes = [random.choice(codes) for _ in range(lookups)]
+
+  for label, dbase in interfaces.items():
+    def lookup(code, dbase=dbase):
+      name = dbase.query("store_" + storeid, "Name", "Barcode", code)
+      if name is None:
+        name = dbase.query("eanref", "product_name", "code", code)
+      return name
+    time_calls(lookup, codes[:min(len(codes), 1000)]) # warm up: fills the schema cache and prepares the statements
+    report(label, time_calls(lookup, codes))
+
+  for dbase in interfaces.values():
+    dbase.close()
+
+# the n-th synthetic barcode: a valid EAN-13, distinct for every n below 10^8 and
+# scattered over the code space so keys don't arrive in index order
+def synthetic_barcode(n):
+  body = f"{(n * 7919 + 20000000000) % 10**12:012d}"
+  return body + str(gtin_check_digit(body))
+
+def write_eanref_tsv(filename, rows):
+  """
+  Writes an Open Food Facts-shaped TSV of 'rows' products, with a column the
+  import has to skip over.
+  """
+  with open(filename, 'w', encoding='utf-8', newline='') as f:
+    f.write("code\tproduct_name\tbrands\n")
+    for n in range(rows):
+      f.write(f"{synthetic_barcode(n)}\tProduct {n}\tBrand {n % 500}\n")
+
+def write_approvals_csv(filename, products):
+  """
+  Writes a store approval list for the given product numbers as CSV.
+  """
+  with open(filename, 'w', encoding='utf-8', newline='') as f:
+    f.write("Barcode,Name\n")
+    for n in products:
+      f.write(f"{synthetic_barcode(n)},Approved {n}\n")
+
+# post every payload to /api/receive from 'clients' threads, each with its own test
+# client. Returns (per-request latencies sorted, wall-clock seconds, non-200 replies)
+def drive(app, payloads, clients):
+  def run(share):
+    client = app.test_client()
+    latencies = []
+    failures = 0
+    for payload in share:
+      start = time.perf_counter()
+      response = client.post("/api/receive", json=payload)
+      latencies.append(time.perf_counter() - start)
+      if response.status_code != 200:
+        failures += 1
+    return latencies, failures
+
+  shares = [payloads[i::clients] for i in range(clients)]
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=clients) as executor:
+    outcomes = list(executor.map(run, shares))
+  wall = time.perf_counter() - start
+  latencies = sorted(latency for share_latencies, _ in outcomes for latency in share_latencies)
+  return latencies, wall, sum(failures for _, failures in outcomes)
+
+def bench_suite(rows=100000, stores=10, store_rows=None, requests=2000, clients=8, lookups=1000, page=1000,
+                backend="sqlite", seed=0):
+  """
+  Builds a synthetic data set and times the operations the server depends on.
+
+  Args:
+      rows (int, optional): Products in eanref. Defaults to 100000.
+      stores (int, optional): Store tables to fill. Defaults to 10.
+      store_rows (int, optional): Products approved per store, sampled from eanref.
+                                  Defaults to None (a tenth of 'rows').
+      requests (int, optional): Requests per covered? / get_appr run. Defaults to 2000.
+      clients (int, optional): Concurrent test clients in the concurrent runs, and the
+                               connection pool size. Defaults to 8.
+      lookups (int, optional): find_row_index calls. Defaults to 1000.
+      page (int, optional): Rows per get_appr page. Defaults to 1000.
+      backend (str, optional): "sqlite" for the in-process stand-in or "mysql" for
+                               BENCH_DB_NAME on the configured server. Defaults to "sqlite".
+      seed (int, optional): Seed for the sampled products and requests. Defaults to 0.
+
+  Returns:
+      dict: The run's settings and its results, as written by --json.
+  """
+  rng = random.Random(seed)
+  store_rows = min(rows, store_rows if store_rows is not None else max(1, rows // 10))
+  settings = {"backend": backend, "rows": rows, "stores": stores, "store_rows": store_rows, "requests": requests,
+              "clients": clients, "lookups": lookups, "page": page, "seed": seed}
+  results = []
+  work_dir = tempfile.mkdtemp(prefix="ycp_benchmark_")
+  try:
+    if backend == "mysql":
+      dbase = SQLInterface(DB_HOST, BENCH_DB_NAME, DB_USERNAME, DB_PASSWORD, pool_size=clients,
+                           prepared_statements=DB_PREPARED_STATEMENTS)
+    else:
+      dbase = SQLiteInterface(os.path.join(work_dir, "benchmark.db"), pool_size=clients,
+                              prepared_statements=DB_PREPARED_STATEMENTS)
+    server = Server(barcode_index_path=None, dbase=dbase)
+    server.warm_up()
+    storeids = [str(storeid) for storeid in range(stores)]
+    for row in dbase.list_tables():
+      if row[0] in ("eanref", "stores", "bench_csv") or row[0].startswith("store_"):
+        dbase.delete_table(row[0]) # left over from an earlier run
+
+    # --- eanref, through import_large_tsv ---
+    print(f"Writing {rows} synthetic products...")
+    tsv_file = os.path.join(work_dir, "eanref.tsv")
+    write_eanref_tsv(tsv_file, rows)
+    start = time.perf_counter()
+    # LOAD DATA only exists on MySQL; SQLite goes straight to the INSERT path
+    dbase.import_large_tsv(tsv_file, "eanref", EANREF_COLUMNS, bulk_load=backend == "mysql")
+    results.append(report_bulk("import_large_tsv", rows, time.perf_counter() - start))
+
+    # --- the stores and their approval lists (not timed) ---
+    # the lists first: writing the stores table makes the server load every store's
+    approved = {}
+    for storeid in storeids:
+      approved[storeid] = rng.sample(range(rows), store_rows)
+      dbase.new_table("store_" + storeid, APPROVED_DB_COLUMN_NAMES)
+      dbase.insert_rows("store_" + storeid, ({"Barcode": int(synthetic_barcode(n)), "Name": f"Approved {n}"}
+                                             for n in approved[storeid]))
+    dbase.new_table("stores", STORE_DB_COLUMN_NAMES)
+    dbase.insert_rows("stores", [{"StoreID": storeid, "Name": f"Store {storeid}"} for storeid in storeids])
+
+    # --- one approval list again, through import_csv ---
+    csv_file = os.path.join(work_dir, "approvals.csv")
+    write_approvals_csv(csv_file, approved[storeids[0]] if storeids else range(store_rows))
+    start = time.perf_counter()
+    dbase.import_csv(csv_file, "bench_csv")
+    results.append(report_bulk("import_csv", store_rows, time.perf_counter() - start))
+
+    # --- export_table ---
+    start = time.perf_counter()
+    exported = dbase.export_table("eanref", os.path.join(work_dir, "eanref.csv"))
+    results.append(report_bulk("export_table", exported or 0, time.perf_counter() - start))
+
+    # --- find_row_index (the first call builds the row order index, so it is left out) ---
+    codes = [int(synthetic_barcode(rng.randrange(rows))) for _ in range(lookups)]
+    dbase.find_row_index("eanref", "code", codes[0])
+    results.append(report("find_row_index", time_calls(lambda code: dbase.find_row_index("eanref", "code", code), codes)))
+
+    # --- covered? and get_appr through the app, alone and concurrently ---
+    def covered_payloads():
+      # one in ten products are unknown to eanref as well as to the store
+      return [{"command": "covered?", "StoreID": rng.choice(storeids),
+               "Barcode": synthetic_barcode(rng.randrange(rows) if rng.random() < 0.9 else rows + rng.randrange(rows))}
+              for _ in range(requests)]
+    def get_appr_payloads():
+      payloads = []
+      for _ in range(requests):
+        storeid = rng.choice(storeids)
+        payload = {"command": "get_appr", "StoreID": storeid, "limit": page}
+        if rng.random() < 0.5:
+          payload["after"] = int(synthetic_barcode(rng.choice(approved[storeid]))) # a later page
+        payloads.append(payload)
+      return payloads
+
+    if storeids:
+      for command, make_payloads in (("covered?", covered_payloads), ("get_appr", get_appr_payloads)):
+        for run_clients in sorted({1, clients}):
+          server.lookup_cache.invalidate_all() # each run starts cold
+          latencies, wall, failures = drive(server.app, make_payloads(), run_clients)
+          results.append(report(f"{command} x{run_clients}", latencies, wall))
+          if failures:
+            print(f"  {failures} of {len(latencies)} requests failed")
+
+    server.shutdown()
+  finally:
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+  print(f"\n--- {backend}, {rows} products, {stores} stores of {store_rows}, {clients} clients ---")
+  for result in results:
+    _print_result(result)
+  return {"settings": settings, "results": results}
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Throughput and latency benchmarks.")
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  prepared = commands.add_parser("prepared", help="text protocol vs prepared statements, against server.py's database")
+  prepared.add_argument("lookups", type=int, nargs="?", default=20000)
+
+  suite = commands.add_parser("suite", help="imports, export, lookups and requests over synthetic data")
+  suite.add_argument("--rows", type=int, default=100000, help="products in eanref (10k to 10M)")
+  suite.add_argument("--stores", type=int, default=10)
+  suite.add_argument("--store-rows", type=int, default=None, help="products per store (default rows/10)")
+  suite.add_argument("--requests", type=int, default=2000, help="requests per covered?/get_appr run")
+  suite.add_argument("--clients", type=int, default=8, help="concurrent test clients")
+  suite.add_argument("--lookups", type=int, default=1000, help="find_row_index calls")
+  suite.add_argument("--page", type=int, default=1000, help="rows per get_appr page")
+  suite.add_argument("--seed", type=int, default=0)
+  suite.add_argument("--mysql", action="store_true", help=f"use the '{BENCH_DB_NAME}' database instead of SQLite")
+  suite.add_argument("--json", help="also write the results to this file")
+
+  args = parser.parse_args()
+  if args.command == "prepared":
+    bench_prepared(args.lookups)
+  else:
+    run = bench_suite(args.rows, args.stores, args.store_rows, args.requests, args.clients, args.lookups, args.page,
+                      "mysql" if args.mysql else "sqlite", args.seed)
+    if args.json:
+      with open(args.json, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2)
+      print(f"Wrote results to '{args.json}'")
@@ -0,0 +1,163 @@
+#OUTBOUND FORWARDING
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+class ForwarderBusy(Exception):
+  """Raised when the concurrency limit or the job queue is full."""
+
+class Forwarder():
+  def __init__(self, timeout=(3.05, 10), max_concurrent=16, max_queued=1000, retries=3, backoff=0.5,
+               jobs_kept=10000):
+    """
+    POSTs JSON payloads to remote servers over one pooled keep-alive session.
+
+    send() forwards in the caller's thread; submit() queues the request for a
+    background worker, which retries connection errors and 5xx replies with
+    exponential backoff, and returns a job id at once. Both count against the
+    same limit on requests in flight, so a slow remote can tie up at most
+    'max_concurrent' threads.
+
+    Args:
+        timeout (tuple, optional): (connect, read) seconds per attempt. Defaults to (3.05, 10).
+        max_concurrent (int, optional): Requests in flight at once. Defaults to 16.
+        max_queued (int, optional): Queued jobs not yet finished before submit()
+                                    refuses more. Defaults to 1000.
+        retries (int, optional): Extra attempts for a queued job. Defaults to 3.
+        backoff (float, optional): Seconds before the first retry, doubled for each
+                                   one after. Defaults to 0.5.
+        jobs_kept (int, optional): Finished jobs remembered for job(). Defaults to 10000.
+    """
+    self.timeout = timeout
+    self.max_concurrent = max_concurrent
+    self.max_queued = max_queued
+    self.retries = retries
+    self.backoff = backoff
+    self.jobs_kept = jobs_kept
+
+    self.session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_concurrent, pool_maxsize=max_concurrent)
+    self.session.mount('http://', adapter)
+    self.session.mount('https://', adapter)
+
+    self._in_flight = threading.BoundedSemaphore(max_concurrent)
+    self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='forwarder')
+    self._jobs = OrderedDict() # job id -> status dict
+    self._pending = 0
+    self._ids = itertools.count(1)
+    self._lock = threading.Lock()
+
+  def _post(self, url, payload, wait):
+    if not self._in_flight.acquire(timeout=wait):
+      raise ForwarderBusy(f"{self.max_concurrent} requests already in flight")
+    try:
+      response = self.session.post(url, json=payload, timeout=self.timeout)
+    finally:
+      self._in_flight.release()
+    response.raise_for_status()
+    return response
+
+  def send(self, url, payload):
+    """
+    Forwards a payload and waits for the reply.
+
+    Returns:
+        requests.Response: The remote server's reply.
+
+    Raises:
+        ForwarderBusy: If no request slot frees up within the connect timeout.
+        requests.exceptions.RequestException: If the request fails or times out.
+    """
+    # wait for a free slot no longer than a connection attempt would
+    wait = self.timeout[0] if isinstance(self.timeout, tuple) else self.timeout
+    return self._post(url, payload, wait)
+
+  def submit(self, url, payload):
+    """
+    Queues a payload to be forwarded in the background.
+
+    Returns:
+        str: The job id to pass to job().
+
+    Raises:
+        ForwarderBusy: If 'max_queued' jobs are already waiting.
+    """
+    with self._lock:
+      if self._pending >= self.max_queued:
+        raise ForwarderBusy(f"{self.max_queued} jobs already queued")
+      self._pending += 1
+      job_id = str(next(self._ids))
+      self._jobs[job_id] = {"job_id": job_id, "url": url, "status": "queued", "attempts": 0,
+                            "remote_status_code": None, "error": None}
+      while len(self._jobs) > self.jobs_kept + self._pending:
+        oldest = next(iter(self._jobs))
+        if self._jobs[oldest]["status"] not in ("succeeded", "failed"):
+          break
+        del self._jobs[oldest]
+    self._executor.submit(self._run_job, job_id, url, payload)
+    return job_id
+
+  def _run_job(self, job_id, url, payload):
+    job = self._jobs[job_id]
+    try:
+      for attempt in range(self.retries + 1):
+        with self._lock:
+          job["status"] = "running"
+          job["attempts"] = attempt + 1
+        try:
+          response = self._post(url, payload, None)
+          with self._lock:
+            job.update(status="succeeded", remote_status_code=response.status_code, error=None)
+          return
+        except requests.exceptions.HTTPError as e:
+          # the remote answered; only its own failures are worth retrying
+          with self._lock:
+            job.update(remote_status_code=e.response.status_code, error=str(e))
+          if e.response.status_code < 500:
+            break
+        except requests.exceptions.RequestException as e:
+          with self._lock:
+            job["error"] = str(e)
+        if attempt < self.retries:
+          with self._lock:
+            job["status"] = "retrying"
+          time.sleep(self.backoff * 2 ** attempt)
+      with self._lock:
+        job["status"] = "failed"
+    except Exception as e:
+      with self._lock:
+        job.update(status="failed", error=str(e))
+    finally:
+      with self._lock:
+        self._pending -= 1
+
+  def job(self, job_id):
+    """
+    Returns:
+        dict: A snapshot of the job's status, or None if the id is unknown or
+              the job has been forgotten.
+    """
+    with self._lock:
+      job = self._jobs.get(job_id)
+      return dict(job) if job is not None else None
+
+  def stats(self):
+    with self._lock:
+      return {
+        "max_concurrent": self.max_concurrent,
+        "queued": self._pending,
+        "max_queued": self.max_queued,
+        "jobs_kept": len(self._jobs)
+      }
+
+  def close(self, wait=True):
+    """
+    Stops taking jobs and closes the session, by default after the queue drains.
+    """
+    self._executor.shutdown(wait=wait)
+    self.session.close()
@@ -0,0 +1,95 @@
+#BARCODE LOOKUP CACHE
+import threading
+import time
+from collections import OrderedDict
+
+class LookupCache():
+  def __init__(self, max_entries=100000, ttl=300):
+    """
+    A bounded LRU cache of barcode lookups keyed on (StoreID, Barcode).
+
+    Negative results are cached like any other value. Entries expire after 'ttl'
+    seconds, which bounds staleness from writes made by other processes; writes
+    made through this process should call invalidate_store()/invalidate_all().
+    A lookup takes generation() before reading the database and hands it to
+    put(), so an answer read before an invalidation is never cached after it.
+
+    Args:
+        max_entries (int, optional): Entries kept before the least recently used
+                                     is evicted. Defaults to 100000.
+        ttl (float, optional): Seconds an entry stays valid. Defaults to 300.
+    """
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.hits = 0
+    self.misses = 0
+    self._entries = OrderedDict() # (storeid, barcode) -> (expires_at, generation, value)
+    self._generations = {} # storeid -> bumped on every invalidation of that store
+    self._epoch = 0 # bumped by invalidate_all
+    self._lock = threading.Lock()
+
+  def get(self, storeid, barcode):
+    """
+    Returns:
+        The cached value, or None if absent, expired or invalidated.
+    """
+    key = (storeid, barcode)
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None:
+        expires_at, generation, value = entry
+        if expires_at > time.monotonic() and generation == self._generation(storeid):
+          self._entries.move_to_end(key)
+          self.hits += 1
+          return value
+        del self._entries[key]
+      self.misses += 1
+      return None
+
+  # the store's current generation; call with the lock held
+  def _generation(self, storeid):
+    return (self._epoch, self._generations.get(storeid, 0))
+
+  def generation(self, storeid):
+    """
+    Returns:
+        The store's current generation, to pass to put() once the value is read.
+    """
+    with self._lock:
+      return self._generation(storeid)
+
+  def put(self, storeid, barcode, value, generation):
+    """
+    Caches a value read while the store was at 'generation' (from generation()).
+    If the store has been invalidated since, the value may be stale and is dropped.
+    """
+    key = (storeid, barcode)
+    with self._lock:
+      if generation != self._generation(storeid):
+        return
+      self._entries[key] = (time.monotonic() + self.ttl, generation, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  # drop every entry for one store in O(1); stale entries are discarded as they're read or evicted
+  def invalidate_store(self, storeid):
+    with self._lock:
+      self._generations[storeid] = self._generations.get(storeid, 0) + 1
+
+  def invalidate_all(self):
+    with self._lock:
+      self._epoch += 1
+      self._entries.clear()
+
+  def stats(self):
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+        "entries": len(self._entries),
+        "max_entries": self.max_entries,
+        "ttl": self.ttl,
+        "hits": self.hits,
+        "misses": self.misses,
+        "hit_rate": self.hits / lookups if lookups else 0.0
+      }
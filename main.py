@@ -1,11 +1,12 @@
 from sql_interface import *
 
-APPROVED_DB_COLUMNS = "Barcode VARCHAR(255), Name VARCHAR(255), PRIMARY KEY (Barcode)"
+APPROVED_DB_COLUMNS = "Barcode BIGINT, Name VARCHAR(255), PRIMARY KEY (Barcode)"
 STORE_DB_COLUMNS = "StoreID VARCHAR(255), Name VARCHAR(255), PRIMARY KEY (StoreID)"
+APPROVALS_DB_COLUMNS = "StoreID VARCHAR(255), Barcode BIGINT, Name VARCHAR(255), PRIMARY KEY (StoreID, Barcode), KEY (Barcode)"
 
 def fill_reference_db(database, file_path):
   my_columns = {
-    'code': 'VARCHAR(255) PRIMARY KEY',
+    'code': 'BIGINT PRIMARY KEY', # GTIN-14 keys; rows with invalid barcodes are skipped
     'product_name': 'MEDIUMTEXT'
   }
   
@@ -13,7 +14,8 @@ def fill_reference_db(database, file_path):
   database.import_large_tsv(
     filename=file_path,
     tablename='eanref',
-    columns_dict=my_columns
+    columns_dict=my_columns,
+    bulk_load=True
   )
  
 if __name__ == "__main__":
@@ -21,17 +23,20 @@ if __name__ == "__main__":
   dbase.connect()
   
   #fill_reference_db(dbase, "C:/Users/rockstar/Documents/openfoodfacts.csv")
+  #dbase.export_barcode_index("eanref.idx") # lets the server answer eanref lookups locally
   dbase.new_table("stores", STORE_DB_COLUMNS)
-  dbase.insert_row("stores", {'StoreID':"0", 'Name':"Weis"})
-  dbase.insert_row("stores", {'StoreID':"1", 'Name':"Lidl"})
-  dbase.insert_row("stores", {'StoreID':"2", 'Name':"Walmart"})
-  dbase.insert_row("stores", {'StoreID':"3", 'Name':"Target"})
-  dbase.insert_row("stores", {'StoreID':"4", 'Name':"Giant"})
-  dbase.insert_row("stores", {'StoreID':"5", 'Name':"Price Right"})
-  dbase.insert_row("stores", {'StoreID':"6", 'Name':"Aldi"})
-  dbase.insert_row("stores", {'StoreID':"7", 'Name':"7-Eleven"})
-  dbase.insert_row("stores", {'StoreID':"8", 'Name':"Rutters"})
-  dbase.insert_row("stores", {'StoreID':"9", 'Name':"Turkey Hill"})
+  dbase.upsert_rows("stores", [
+    {'StoreID':"0", 'Name':"Weis"},
+    {'StoreID':"1", 'Name':"Lidl"},
+    {'StoreID':"2", 'Name':"Walmart"},
+    {'StoreID':"3", 'Name':"Target"},
+    {'StoreID':"4", 'Name':"Giant"},
+    {'StoreID':"5", 'Name':"Price Right"},
+    {'StoreID':"6", 'Name':"Aldi"},
+    {'StoreID':"7", 'Name':"7-Eleven"},
+    {'StoreID':"8", 'Name':"Rutters"},
+    {'StoreID':"9", 'Name':"Turkey Hill"}
+  ])
   dbase.new_table("store_0", APPROVED_DB_COLUMNS)
   dbase.new_table("store_1", APPROVED_DB_COLUMNS)
   dbase.new_table("store_2", APPROVED_DB_COLUMNS)
@@ -43,6 +48,10 @@ if __name__ == "__main__":
   dbase.new_table("store_8", APPROVED_DB_COLUMNS)
   dbase.new_table("store_9", APPROVED_DB_COLUMNS)
   #dbase.insert_row("store_0", {'Barcode':"0028400020008", 'Name':"Test Product"})
+
+  # all stores' approvals in one table (server.py STORAGE_MODE = "approvals")
+  dbase.new_table("approvals", APPROVALS_DB_COLUMNS)
+  #dbase.migrate_store_tables("approvals") # copy the store_<id> tables into it
   
   #dbase.delete_table("store_0")
   #dbase.delete_table("stores")
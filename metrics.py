@@ -0,0 +1,141 @@
+#METRICS
+#
+# Counters and latency histograms kept in process and rendered in the Prometheus
+# text exposition format for the /metrics route. Everything is thread-safe.
+# Under gunicorn each worker keeps and serves its own figures.
+import bisect
+import threading
+
+# seconds; covers in-memory answers (~10us) through slow database calls
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _format_labels(label_names, label_values, extra=()):
+  pairs = list(zip(label_names, label_values)) + list(extra)
+  if not pairs:
+    return ""
+  escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs]
+  return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+def _format_value(value):
+  if value == float('inf'):
+    return "+Inf"
+  return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter():
+  def __init__(self, name, help_text, label_names=()):
+    self.name = name
+    self.help_text = help_text
+    self.label_names = tuple(label_names)
+    self._values = {} # label values -> count
+    self._lock = threading.Lock()
+
+  def inc(self, *label_values, amount=1):
+    with self._lock:
+      self._values[label_values] = self._values.get(label_values, 0) + amount
+
+  def render(self):
+    lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+    with self._lock:
+      for label_values, value in sorted(self._values.items()):
+        lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+    return lines
+
+class Histogram():
+  def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+    self.name = name
+    self.help_text = help_text
+    self.label_names = tuple(label_names)
+    self.buckets = tuple(sorted(buckets))
+    self._series = {} # label values -> [bucket counts..., +Inf count, sum]
+    self._lock = threading.Lock()
+
+  def observe(self, value, *label_values):
+    index = bisect.bisect_left(self.buckets, value)
+    with self._lock:
+      series = self._series.get(label_values)
+      if series is None:
+        series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+      series[index] += 1
+      series[-1] += value
+
+  def render(self):
+    lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+    with self._lock:
+      for label_values, series in sorted(self._series.items()):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), series):
+          cumulative += count
+          labels = _format_labels(self.label_names, label_values, [("le", _format_value(bound))])
+          lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, label_values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+    return lines
+
+class Registry():
+  def __init__(self):
+    self._metrics = {} # name -> Counter or Histogram
+    self._lock = threading.Lock()
+
+  def counter(self, name, help_text, label_names=()):
+    """
+    Returns:
+        Counter: The counter called 'name', created on first use.
+    """
+    with self._lock:
+      return self._metrics.setdefault(name, Counter(name, help_text, label_names))
+
+  def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+    """
+    Returns:
+        Histogram: The histogram called 'name', created on first use.
+    """
+    with self._lock:
+      return self._metrics.setdefault(name, Histogram(name, help_text, label_names, buckets))
+
+  def render(self, gauges=(), counters=()):
+    """
+    Renders every metric, followed by values read at scrape time.
+
+    Args:
+        gauges (iterable): (name, help_text, value) entries, e.g. pool and cache
+                           sizes read at scrape time.
+        counters (iterable): (name, help_text, value) entries for running totals
+                             kept elsewhere, e.g. cache hits.
+
+    Returns:
+        str: The exposition text.
+    """
+    lines = []
+    with self._lock:
+      metrics = list(self._metrics.values())
+    for metric in metrics:
+      lines.extend(metric.render())
+    for metric_type, entries in (("gauge", gauges), ("counter", counters)):
+      for name, help_text, value in entries:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# database time spent by the calling thread since start_request(), so a request
+# handler can report its DB share separately from its total time
+_request = threading.local()
+
+def start_request():
+  _request.db_seconds = 0.0
+
+def add_db_time(seconds):
+  if getattr(_request, 'db_seconds', None) is not None:
+    _request.db_seconds += seconds
+
+def request_db_time():
+  """
+  Returns:
+      float: Database seconds recorded since start_request(); the request then ends.
+  """
+  seconds = getattr(_request, 'db_seconds', None) or 0.0
+  _request.db_seconds = None
+  return seconds
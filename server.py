@@ -1,30 +1,498 @@
 import json
-from flask import Flask, request, jsonify
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from flask import Flask, Response, request, jsonify
 import requests
 import datetime
 
 from sql_interface import *
+from lookup_cache import LookupCache
+from barcode_index import BarcodeIndex
+from store_coverage import StoreCoverage
+from forwarder import Forwarder, ForwarderBusy
+import metrics
 
-APPROVED_DB_COLUMN_NAMES = "Barcode VARCHAR(255), Name VARCHAR(255), PRIMARY KEY (Barcode)"
+logger = logging.getLogger(__name__)
+
+APPROVED_DB_COLUMN_NAMES = "Barcode BIGINT, Name VARCHAR(255), PRIMARY KEY (Barcode)"
 STORE_DB_COLUMN_NAMES = "StoreID VARCHAR(255), Name VARCHAR(255), PRIMARY KEY (StoreID)"
+APPROVALS_DB_COLUMN_NAMES = ("StoreID VARCHAR(255), Barcode BIGINT, Name VARCHAR(255), "
+                             "PRIMARY KEY (StoreID, Barcode), KEY (Barcode)")
+
+# where approval lists live: "tables" for one store_<id> table per store, or
+# "approvals" for every store in the one approvals table (see
+# SQLInterface.migrate_store_tables for moving from the first to the second)
+STORAGE_MODE = "tables"
+APPROVALS_TABLE = "approvals"
 
 DB_HOST = "localhost"
 DB_NAME = "hacks2025"
 DB_USERNAME = "root"
 DB_PASSWORD = "root"
+# connections shared by the request threads; each /api/receive call checks one out
+DB_POOL_SIZE = 8
+# run the hot lookups as server-side prepared statements (binary protocol, no reparsing)
+DB_PREPARED_STATEMENTS = True
+
+# "covered?" answers cached per (StoreID, Barcode), misses included
+LOOKUP_CACHE_SIZE = 100000
+LOOKUP_CACHE_TTL = 300
+
+# rows pulled from the database per fetch when streaming a table
+STREAM_CHUNK_SIZE = 1000
+
+# most (store, barcode) pairs one covered_batch request may ask about
+COVERED_BATCH_MAX_PAIRS = 10000
+
+# optional local copy of eanref built by SQLInterface.export_barcode_index; when the
+# file exists, reference names are looked up in it instead of in the database
+BARCODE_INDEX_PATH = "eanref.idx"
+
+# hold every store's approval list in memory (loaded at startup, patched when a
+# store table is written through this process) so coverage checks skip the database
+PRELOAD_STORE_COVERAGE = True
+# seconds before a preloaded list is reloaded, which picks up writes made by other
+# processes, and how often the background thread looks for such lists and new stores
+COVERAGE_MAX_AGE = 300
+COVERAGE_CHECK_INTERVAL = 10
+
+# /api/send forwarding: (connect, read) timeout per attempt, requests in flight at
+# once, and for "async" sends the queue length and retries on failure
+SEND_TIMEOUT = (3.05, 10)
+SEND_MAX_CONCURRENT = 16
+SEND_QUEUE_SIZE = 1000
+SEND_RETRIES = 3
+
+# production serving (serve()): worker processes, request
+# threads per worker, and seconds in-flight requests get to finish on shutdown.
+# Each worker opens its own pool of SERVER_THREADS connections.
+SERVER_WORKERS = 4
+SERVER_THREADS = 8
+SHUTDOWN_TIMEOUT = 30
+
+# level for the server's and SQLInterface's logging; per-request detail is DEBUG,
+# so the default keeps the hot path quiet
+LOG_LEVEL = "INFO"
+
+# /api/receive commands reported by name in the metrics; anything else counts as "other"
+RECEIVE_COMMANDS = ("get_appr", "get_stores", "covered?", "covered_batch", "where_covered")
+
+RECEIVE_SECONDS = metrics.REGISTRY.histogram(
+    "ycp_receive_seconds", "Total time handling an /api/receive command.", ["command"])
+RECEIVE_DB_SECONDS = metrics.REGISTRY.histogram(
+    "ycp_receive_db_seconds", "Time an /api/receive command spent in database calls.", ["command"])
+RECEIVE_REQUESTS = metrics.REGISTRY.counter(
+    "ycp_receive_requests_total", "/api/receive commands handled, by command and status code.", ["command", "status"])
+
+def configure_logging(level=LOG_LEVEL):
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+def _column_value(row, column):
+    """
+    A column's value in a written row's dict, whatever case the writer gave
+    the column name in (None if absent).
+    """
+    for name, value in row.items():
+        if name.lower() == column.lower():
+            return value
+    return None
+
+def coverage_response(code, store_name, ref_name):
+    """
+    Builds the "covered?" reply from the store table's name for the barcode (None
+    if the store doesn't cover it) and the eanref name (None if unknown).
+    """
+    if store_name is not None:
+        return {
+            "Response": "Yes",
+            "Barcode": code,
+            "Name": store_name
+        }
+    if ref_name is not None:
+        return {
+            "Response": "No",
+            "Barcode": code,
+            "Name": ref_name
+        }
+    return {
+        "Response": "No",
+        "Barcode": "None",
+        "Name": "None"
+    }
 
 class Server:
-    def __init__(self, host='0.0.0.0', port=5000):
+    def __init__(self, host='0.0.0.0', port=5000, barcode_index_path=BARCODE_INDEX_PATH, pool_size=DB_POOL_SIZE,
+                 storage_mode=STORAGE_MODE, dbase=None):
         """
         Initializes the backend server.
+
+        'dbase' is an SQLInterface to serve from instead of one built from the DB_*
+        settings (e.g. the SQLite stand-in the benchmarks use). warm_up() connects it.
         """
         self.host = host
         self.port = port
+        self.storage_mode = storage_mode
+        self.barcode_index_path = barcode_index_path
         self.app = Flask(__name__)
         self.last_data_received = None
         self.setup_routes()
         
-        self.dbase = SQLInterface(DB_HOST, DB_NAME, DB_USERNAME, DB_PASSWORD)
+        if dbase is None:
+            dbase = SQLInterface(DB_HOST, DB_NAME, DB_USERNAME, DB_PASSWORD, pool_size=pool_size,
+                                 prepared_statements=DB_PREPARED_STATEMENTS)
+        self.dbase = dbase
+        self.dbase.prepare_statement("store_list", "SELECT StoreID, Name FROM stores ORDER BY StoreID")
+        self.lookup_cache = LookupCache(LOOKUP_CACHE_SIZE, LOOKUP_CACHE_TTL)
+        self.coverage = StoreCoverage()
+        self.store_names = None # StoreID -> store name, kept once coverage is preloaded
+        self._refresh_stop = threading.Event()
+        self._refresh_thread = None
+        self.forwarder = Forwarder(SEND_TIMEOUT, SEND_MAX_CONCURRENT, SEND_QUEUE_SIZE, SEND_RETRIES)
+        self.dbase.add_write_listener(self.on_table_write)
+
+        self.barcode_index = None
+        if barcode_index_path and os.path.exists(barcode_index_path):
+            try:
+                self.barcode_index = BarcodeIndex(barcode_index_path)
+                print(f"Serving eanref lookups from '{barcode_index_path}' ({len(self.barcode_index)} barcodes)")
+            except (OSError, ValueError) as e:
+                print(f"Could not open barcode index '{barcode_index_path}': {e}")
+
+    def store_source(self, storeid):
+        """
+        Where a store's approval list is read from, for the storage mode in use.
+
+        Returns:
+            tuple: (tablename, where) to pass to the SQLInterface read methods.
+        """
+        if self.storage_mode == "approvals":
+            return APPROVALS_TABLE, {"StoreID": storeid}
+        return "store_" + storeid, None
+
+    def on_table_write(self, tablename, changes=None):
+        """
+        Drops cached lookups that a write to 'tablename' may have made stale.
+
+        'changes' is the written rows as passed to SQLInterface write listeners; when
+        they are known only the stores they belong to are touched, and single
+        approvals are patched into the coverage index instead of reloading the store.
+        """
+        if self.storage_mode == "approvals" and tablename == APPROVALS_TABLE:
+            by_store = {}
+            for before, after in changes or ():
+                storeid = _column_value(dict(before or {}, **(after or {})), "StoreID")
+                if storeid is None:
+                    by_store = None # some row's store isn't known
+                    break
+                by_store.setdefault(str(storeid), []).append((before, after))
+            if not changes or by_store is None:
+                self.lookup_cache.invalidate_all()
+                for storeid in self.coverage.loaded_stores():
+                    self.coverage.drop_store(storeid)
+                if PRELOAD_STORE_COVERAGE:
+                    self.load_coverage()
+                return
+            for storeid, store_changes in by_store.items():
+                self.apply_store_changes(storeid, store_changes)
+        elif self.storage_mode == "tables" and tablename.startswith("store_"):
+            storeid = tablename[len("store_"):]
+            if changes is not None:
+                self.apply_store_changes(storeid, changes)
+                return
+            self.lookup_cache.invalidate_store(storeid)
+            self.coverage.drop_store(storeid)
+            if PRELOAD_STORE_COVERAGE:
+                self.load_store_coverage(storeid)
+        elif tablename == "stores":
+            if PRELOAD_STORE_COVERAGE:
+                self.load_coverage()
+        elif tablename == "eanref":
+            # the local index no longer matches the table; fall back to the database
+            barcode_index, self.barcode_index = self.barcode_index, None
+            if barcode_index is not None:
+                barcode_index.close()
+            self.lookup_cache.invalidate_all()
+
+    def apply_store_changes(self, storeid, changes):
+        """
+        Applies known row changes to one store's cached approvals: each row is
+        patched into the coverage index, and the store is reloaded only if a row
+        doesn't carry its barcode and name.
+        """
+        self.lookup_cache.invalidate_store(storeid)
+        if storeid not in self.coverage.loaded_stores():
+            return
+        for before, after in changes:
+            old_code = _column_value(before, "Barcode") if before is not None else None
+            new_code = _column_value(after, "Barcode") if after is not None else None
+            name = _column_value(after, "Name") if after is not None else None
+            if (before is not None and old_code is None) or (after is not None and (new_code is None or name is None)):
+                self.coverage.drop_store(storeid)
+                self.load_store_coverage(storeid)
+                return
+            if old_code is not None:
+                self.coverage.set_approval(storeid, old_code, None)
+            if new_code is not None:
+                self.coverage.set_approval(storeid, new_code, name)
+
+    def refresh_coverage(self):
+        """
+        Background loop run while coverage is preloaded: reloads store lists older
+        than COVERAGE_MAX_AGE, so writes made by other processes show up, and picks
+        up stores added to the stores table.
+        """
+        while not self._refresh_stop.wait(COVERAGE_CHECK_INTERVAL):
+            try:
+                for storeid in self.coverage.stale_stores(COVERAGE_MAX_AGE):
+                    self.lookup_cache.invalidate_store(storeid)
+                    self.load_store_coverage(storeid)
+                self.load_coverage()
+            except Exception as e:
+                print(f"Coverage refresh failed: {e}")
+
+    def reference_names(self, codes):
+        """
+        Looks barcodes up in eanref, through the local barcode index if one is open.
+
+        Returns:
+            dict: Maps each barcode found to its product name, or None if the query fails.
+        """
+        barcode_index = self.barcode_index
+        if barcode_index is not None:
+            names = {}
+            for code in codes:
+                name = self.reference_name(code)
+                if name is not None:
+                    names[code] = name
+            return names
+        return self.dbase.query_many("eanref", "product_name", "code", codes)
+
+    def reference_name(self, code):
+        """
+        Single-barcode form of reference_names (None if unknown).
+
+        The index is searched with the same key the database would be, the code's
+        GTIN-14 number when eanref.code is a BIGINT; with a VARCHAR code column
+        the index needs an exact match, where the database's collation doesn't.
+        """
+        barcode_index = self.barcode_index
+        if barcode_index is not None:
+            key = self.dbase.barcode_key("eanref", "code", code)
+            if key is None:
+                return None
+            try:
+                return barcode_index.get(key)
+            except ValueError:
+                pass # closed by on_table_write while in use; ask the database
+        return self.dbase.query("eanref", "product_name", "code", code)
+
+    def store_key(self, storeid, code):
+        """
+        The key a store's approval list holds a barcode under: its canonical
+        GTIN-14 number if the list's Barcode column is a BIGINT (None if the code
+        is invalid), otherwise the code as given.
+        """
+        tablename, _ = self.store_source(storeid)
+        return self.dbase.barcode_key(tablename, "Barcode", code)
+
+    def load_store_coverage(self, storeid):
+        """
+        (Re)loads one store's approval list into the in-memory coverage index.
+        If the table can't be read the store is left out and answered from the database.
+        """
+        tablename, where = self.store_source(storeid)
+        names = self.dbase.query_all(tablename, "Name", "Barcode", where)
+        if names is None:
+            self.coverage.drop_store(storeid)
+            return False
+        self.coverage.load_store(storeid, names)
+        return True
+
+    def load_coverage(self):
+        """
+        Loads the approval list of every store in the stores table.
+        """
+        store_names = self.dbase.query_all("stores", "Name", "StoreID")
+        if store_names is None:
+            return
+        self.store_names = store_names
+        for storeid in store_names:
+            if storeid not in self.coverage.loaded_stores():
+                self.load_store_coverage(storeid)
+        # runs on every refresh_coverage pass, so only warm_up() reports it
+        logger.debug("Loaded store coverage: %s", self.coverage.stats())
+
+    def check_coverage(self, storeid, code):
+        """
+        Answers whether a store covers a barcode, falling back to the eanref
+        table for the product name. Served from the lookup cache when possible.
+        """
+        response_data = self.lookup_cache.get(storeid, code)
+        if response_data is not None:
+            return response_data
+
+        # taken before reading, so an answer a concurrent write invalidates isn't cached
+        generation = self.lookup_cache.generation(storeid)
+        store_names = self.coverage.get_store(storeid)
+        if store_names is not None:
+            resp = store_names.get(self.store_key(storeid, code))
+        else:
+            tablename, where = self.store_source(storeid)
+            logger.debug("querying from %s with code %s", tablename, code)
+            resp = self.dbase.query(tablename, "Name", "Barcode", code, where)
+            logger.debug("Response: %s", resp)
+        match = None
+        if resp is None:
+          match = self.reference_name(code)
+
+        response_data = coverage_response(code, resp, match)
+        self.lookup_cache.put(storeid, code, response_data, generation)
+        return response_data
+
+    def check_coverage_batch(self, storeids, codes):
+        """
+        Batch form of check_coverage: answers every (store, barcode) pair from the
+        in-memory store lists, or one IN (...) query per store table that isn't
+        loaded, plus one eanref lookup for the barcodes no store covered.
+
+        Returns:
+            list: One response per pair, store-major in the order given, each
+                  tagged with its "StoreID".
+        """
+        results = {}
+        missing = {} # storeid -> codes not in the cache
+        generations = {} # storeid -> cache generation before its codes were read
+        for storeid in storeids:
+            for code in codes:
+                cached = self.lookup_cache.get(storeid, code)
+                if cached is not None:
+                    results[(storeid, code)] = cached
+                else:
+                    if storeid not in missing:
+                        generations[storeid] = self.lookup_cache.generation(storeid)
+                    missing.setdefault(storeid, []).append(code)
+
+        covered = {}
+        uncovered_codes = []
+        for storeid, store_codes in missing.items():
+            store_names = self.coverage.get_store(storeid)
+            if store_names is not None:
+                names = {}
+                for code in store_codes:
+                    name = store_names.get(self.store_key(storeid, code))
+                    if name is not None:
+                        names[code] = name
+            else:
+                tablename, where = self.store_source(storeid)
+                names = self.dbase.query_many(tablename, "Name", "Barcode", store_codes, where)
+            if names is None:
+                raise Exception(f"could not query store {storeid}")
+            covered[storeid] = names
+            uncovered_codes.extend(code for code in store_codes if code not in names)
+
+        ref_names = {}
+        if uncovered_codes:
+            ref_names = self.reference_names(uncovered_codes)
+            if ref_names is None:
+                raise Exception("could not query eanref")
+
+        for storeid, store_codes in missing.items():
+            for code in store_codes:
+                response_data = coverage_response(code, covered[storeid].get(code), ref_names.get(code))
+                self.lookup_cache.put(storeid, code, response_data, generations[storeid])
+                results[(storeid, code)] = response_data
+
+        return [dict(results[(storeid, code)], StoreID=storeid) for storeid in storeids for code in codes]
+
+    def where_covered(self, code):
+        """
+        Answers which of the stores in the stores table approve a barcode. Stores
+        held in memory are answered from the coverage index; any others are
+        searched with one query: a Barcode lookup in the approvals table, or a
+        UNION ALL across the store tables.
+        """
+        store_names = self.store_names
+        if store_names is None:
+            store_names = self.dbase.query_all("stores", "Name", "StoreID")
+            if store_names is None:
+                raise Exception("could not read the stores table")
+
+        # the store lists are assumed to share a layout, so one key serves them all
+        loaded = self.coverage.loaded_stores()
+        key = self.store_key(loaded[0], code) if loaded else None
+        names = dict(self.coverage.stores_covering(key)) if key is not None else {} # storeid -> product name
+        loaded = set(loaded)
+        unloaded = [storeid for storeid in store_names if storeid not in loaded]
+        if unloaded and self.storage_mode == "approvals":
+            found = self.dbase.query_all(APPROVALS_TABLE, "Name", "StoreID", {"Barcode": code})
+            if found is None:
+                raise Exception("could not query the approvals table")
+            for storeid in unloaded:
+                if found.get(storeid) is not None:
+                    names[storeid] = found[storeid]
+        elif unloaded:
+            found = self.dbase.query_tables(["store_" + storeid for storeid in unloaded], "Name", "Barcode", code)
+            if found is None:
+                raise Exception("could not query the store tables")
+            for tablename, name in found.items():
+                if name is not None:
+                    names[tablename[len("store_"):]] = name
+
+        stores = [{"StoreID": storeid, "Name": store_name}
+                  for storeid, store_name in store_names.items() if storeid in names]
+        name = next((names[store["StoreID"]] for store in stores), None)
+        if name is None:
+            name = self.reference_names([code]).get(code)
+        return {
+            "Response": "Yes" if stores else "No",
+            "Barcode": code,
+            "Name": name if name is not None else "None",
+            "Stores": stores
+        }
+
+    def table_response(self, tablename, data, where=None):
+        """
+        Serves a whole table for get_appr/get_stores, or the rows of it matching
+        'where'. The request may page it with "limit" and "after" (keyset
+        pagination on the primary key), or set "stream": true to have it sent as a
+        chunked response read off the database in STREAM_CHUNK_SIZE batches.
+        """
+        limit, after = data.get("limit"), data.get("after")
+        if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit <= 0):
+            return {"error": "'limit' must be a positive integer"}, 400
+        if after is not None and (isinstance(after, bool) or not isinstance(after, (str, int))):
+            return {"error": "'after' must be a primary key value"}, 400
+
+        if data.get("stream"):
+            if not self.dbase.get_column_names(tablename):
+                return {"error": f"Could not read table '{tablename}'"}, 400
+            rows = self.dbase.iter_table_rows(tablename, STREAM_CHUNK_SIZE, after, where)
+            try:
+                # run the query before answering, so a bad request still gets its 400
+                first = next(rows, None)
+            except ValueError as e:
+                return {"error": str(e)}, 400
+
+            def generate():
+                # a read that fails part-way raises out of here, and the server cuts
+                # the response off instead of closing the JSON as if it were complete
+                yield '{"payload": ['
+                if first is not None:
+                    yield json.dumps(first, default=str)
+                    for row in rows:
+                        yield ',' + json.dumps(row, default=str)
+                yield ']}'
+
+            return Response(generate(), mimetype='application/json'), 200
+
+        payload = self.dbase.get_table_as_json_payload(tablename, limit, after, where)
+        if payload is None:
+            return {"error": f"Could not read table '{tablename}'"}, 400
+        return payload, 200
 
     def setup_routes(self):
         @self.app.route('/')
@@ -33,6 +501,43 @@ class Server:
         
         @self.app.route('/api/receive', methods=['POST'])
         def handle_receive_and_process():
+            start = time.perf_counter()
+            metrics.start_request()
+            data = request.get_json(silent=True)
+            command = data.get("command") if isinstance(data, dict) else None
+            label = command if command in RECEIVE_COMMANDS else "other"
+
+            def record(status_code):
+                RECEIVE_SECONDS.observe(time.perf_counter() - start, label)
+                RECEIVE_DB_SECONDS.observe(metrics.request_db_time(), label)
+                RECEIVE_REQUESTS.inc(label, str(status_code))
+
+            try:
+                # made here rather than by Flask, so the status recorded is the one sent
+                response = self.app.make_response(process_receive())
+            except Exception:
+                record(500)
+                raise
+            if not response.is_streamed:
+                record(response.status_code)
+                return response
+
+            # a streamed body is read off the database as it is sent, so the request
+            # is recorded once it has all gone out (as a 500 if it was cut off)
+            body = response.response
+
+            def recorded_body():
+                status_code = 500
+                try:
+                    yield from body
+                    status_code = response.status_code
+                finally:
+                    record(status_code)
+
+            response.response = recorded_body()
+            return response
+
+        def process_receive():
             try:
                 # RECEIVE THE COMMAND
                 data = request.get_json()
@@ -48,41 +553,47 @@ class Server:
                     storeid = data.get("StoreID")
                     self.last_data_received = storeid
                     
-                    response_data = self.dbase.get_table_as_json_payload("store_" + storeid)
-                    status_code = 200
+                    tablename, where = self.store_source(storeid)
+                    response_data, status_code = self.table_response(tablename, data, where)
                 # get list of stores
                 elif command == "get_stores":
-                    response_data = self.dbase.get_table_as_json_payload("stores")
-                    status_code = 200
+                    if any(data.get(option) for option in ("limit", "after", "stream")):
+                        response_data, status_code = self.table_response("stores", data)
+                    else:
+                        rows = self.dbase.execute_statement("store_list")
+                        if rows is None:
+                            return {"error": "Could not read the stores table"}, 400
+                        response_data = {
+                            "payload": [{"StoreID": storeid, "Name": name} for storeid, name in rows]
+                        }
+                        status_code = 200
                 
                 # check if item is covered in store
                 elif command == "covered?":
                     code = data.get("Barcode")
                     storeid = data.get("StoreID")
-                    tablename = "store_" + storeid
-                    print(f"querying from {tablename} with code {code}")
-                    resp = self.dbase.query(tablename, "Name", "Barcode", code)
-                    print(f"Response: {resp}")
-                    if resp is not None:
-                      response_data = {
-                        "Response": "Yes",
-                        "Barcode": code,
-                        "Name": resp
-                      }
-                    else:
-                      match = self.dbase.query("eanref", "product_name", "code", code)
-                      if match is not None:
-                        response_data = {
-                          "Response": "No",
-                          "Barcode": code,
-                          "Name": match
-                        }
-                      else:
-                        response_data = {
-                          "Response": "No",
-                          "Barcode": "None",
-                          "Name": "None"
-                        }
+                    response_data = self.check_coverage(storeid, code)
+                    status_code = 200
+
+                # list every store that covers an item
+                elif command == "where_covered":
+                    code = data.get("Barcode")
+                    if code is None:
+                        return {"error": "where_covered needs a 'Barcode'"}, 400
+                    response_data = self.where_covered(code)
+                    status_code = 200
+
+                # check a whole basket of items against one or more stores
+                elif command == "covered_batch":
+                    codes = data.get("Barcodes")
+                    storeids = data.get("StoreIDs") or [data.get("StoreID")]
+                    if not isinstance(codes, list) or not isinstance(storeids, list) or None in storeids:
+                        return {"error": "covered_batch needs a 'Barcodes' list and a 'StoreID' or 'StoreIDs' list"}, 400
+                    if len(codes) * len(storeids) > COVERED_BATCH_MAX_PAIRS:
+                        return {"error": f"covered_batch is limited to {COVERED_BATCH_MAX_PAIRS} (store, barcode) pairs"}, 400
+                    response_data = {
+                        "payload": self.check_coverage_batch(storeids, codes)
+                    }
                     status_code = 200
                 else:
                     self.last_data_received = data
@@ -106,6 +617,21 @@ class Server:
                 "last_stored_data": self.last_data_received
                 }, 200
         
+        @self.app.route('/metrics', methods=['GET'])
+        def get_metrics():
+            return Response(metrics.REGISTRY.render(self.metric_gauges(), self.metric_counters()),
+                            mimetype='text/plain; version=0.0.4'), 200
+
+        @self.app.route('/api/stats', methods=['GET'])
+        def get_stats():
+            return {
+                "status": "ok",
+                "lookup_cache": self.lookup_cache.stats(),
+                "coverage": self.coverage.stats(),
+                "db_pool": self.dbase.pool_stats(),
+                "forwarder": self.forwarder.stats()
+                }, 200
+        
         @self.app.route('/api/send', methods=['POST'])
         def send_data():
             try:
@@ -116,9 +642,17 @@ class Server:
                 target_url = data['url']
                 payload = data['payload']
 
-                print(f"Sending data to {target_url}...")
-                response = requests.post(target_url, json=payload)
-                response.raise_for_status() 
+                # queue it and answer at once; the job is polled at /api/send/<job_id>
+                if data.get("async"):
+                    job_id = self.forwarder.submit(target_url, payload)
+                    return {
+                        "status": "queued",
+                        "message": f"Queued data for {target_url}.",
+                        "job_id": job_id
+                    }, 202
+
+                logger.info("Sending data to %s...", target_url)
+                response = self.forwarder.send(target_url, payload)
 
                 return {
                     "status": "success",
@@ -126,19 +660,169 @@ class Server:
                     "remote_server_status_code": response.status_code
                 }, 200
 
+            except ForwarderBusy as e:
+                return {"status": "error", "message": f"Too many sends in progress: {e}"}, 503
             except requests.exceptions.RequestException as e:
                 return {"status": "error", "message": f"Failed to send data: {e}"}, 500
             except Exception as e:
                 return {"error": f"Invalid request: {e}"}, 400
 
-    def run(self):
+        @self.app.route('/api/send/<job_id>', methods=['GET'])
+        def send_status(job_id):
+            job = self.forwarder.job(job_id)
+            if job is None:
+                return {"error": f"Unknown job '{job_id}'"}, 404
+            return job, 200
+
+    def metric_counters(self):
         """
-        Starts the Flask web server.
+        Totals kept by the caches themselves, for /metrics, read at scrape time.
+        """
+        cache = self.lookup_cache.stats()
+        return [
+            ("ycp_lookup_cache_hits_total", "Lookup cache hits since start.", cache["hits"]),
+            ("ycp_lookup_cache_misses_total", "Lookup cache misses since start.", cache["misses"])
+        ]
+
+    def metric_gauges(self):
+        """
+        Pool, cache and queue sizes for /metrics, read at scrape time.
+        """
+        cache = self.lookup_cache.stats()
+        coverage = self.coverage.stats()
+        forwarder = self.forwarder.stats()
+        gauges = [
+            ("ycp_lookup_cache_entries", "Entries in the covered? lookup cache.", cache["entries"]),
+            ("ycp_coverage_stores", "Stores held in the in-memory coverage index.", coverage["stores"]),
+            ("ycp_coverage_approvals", "Approvals held in the in-memory coverage index.", coverage["approvals"]),
+            ("ycp_forwarder_queued", "Queued /api/send jobs not yet finished.", forwarder["queued"])
+        ]
+        pool = self.dbase.pool_stats()
+        if pool is not None:
+            gauges.append(("ycp_db_pool_size", "Connections in the database pool.", pool["size"]))
+            gauges.append(("ycp_db_pool_in_use", "Pooled connections checked out.", pool["in_use"]))
+        return gauges
+
+    def warm_up(self):
+        """
+        Connects to the database and fills the in-memory caches, so the first
+        requests don't pay for it. Called before the server accepts traffic.
         """
-        print(f"Starting isolated WebServer on http://{self.host}:{self.port}")
         self.dbase.connect()
+        if PRELOAD_STORE_COVERAGE:
+            self.load_coverage()
+            print(f"Loaded store coverage: {self.coverage.stats()}")
+            self._refresh_thread = threading.Thread(target=self.refresh_coverage, daemon=True)
+            self._refresh_thread.start()
+
+    def shutdown(self):
+        """
+        Lets queued /api/send jobs finish, then closes the database connections
+        and the barcode index.
+        """
+        self.forwarder.close(wait=True)
+        self._refresh_stop.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join()
+        self.dbase.close()
+        if self.barcode_index is not None:
+            self.barcode_index.close()
+            self.barcode_index = None
+
+    def run(self, debug=False, workers=SERVER_WORKERS, threads=SERVER_THREADS):
+        """
+        Starts the web server. With debug=True this is Flask's development server
+        running this Server (one process, reloader and debugger). Otherwise it is
+        serve() on this Server's host, port and barcode index, where every process
+        builds a Server of its own; call serve() directly to skip building this one.
+        """
+        configure_logging()
+        if not debug:
+            serve(self.host, self.port, workers, threads, self.barcode_index_path)
+            return
+
+        print(f"Starting isolated WebServer on http://{self.host}:{self.port}")
+        self.warm_up()
         self.app.run(host=self.host, port=self.port, debug=True)
-         
+
+_worker_server = None # the Server of this process, built by create_app()
+
+def create_app(host='0.0.0.0', port=5000, barcode_index_path=BARCODE_INDEX_PATH, threads=SERVER_THREADS):
+    """
+    Builds and warms up a Server and returns its WSGI app, for running under any
+    WSGI server (e.g. gunicorn "server:create_app()"). The database pool is sized
+    to the request threads, and is closed when the process exits.
+
+    This is the only place serve() builds a Server, so the gunicorn master holds
+    no barcode index, database pool or forwarder; each worker builds its own.
+    """
+    global _worker_server
+    configure_logging()
+    _worker_server = Server(host, port, barcode_index_path, pool_size=threads)
+    _worker_server.warm_up()
+    return _worker_server.app
+
+def _worker_exit(arbiter=None, worker=None):
+    if _worker_server is not None:
+        _worker_server.shutdown()
+
+def serve(host='0.0.0.0', port=5000, workers=SERVER_WORKERS, threads=SERVER_THREADS,
+          barcode_index_path=BARCODE_INDEX_PATH):
+    """
+    Runs the API under a production WSGI server.
+
+    With gunicorn (Linux/macOS) that is 'workers' processes of 'threads' request
+    threads each. Every worker builds its own Server, and with it its own
+    database pool, and warms it up before accepting connections; on SIGTERM
+    workers stop accepting, finish in-flight requests for up to SHUTDOWN_TIMEOUT
+    seconds, then shut their Server down. Where gunicorn isn't available (e.g.
+    Windows) this falls back to waitress: one process with 'threads' threads,
+    whose Server is built the same way.
+    """
+    configure_logging()
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is not None:
+        class Application(BaseApplication):
+            def load_config(self):
+                self.cfg.set("bind", f"{host}:{port}")
+                self.cfg.set("workers", workers)
+                self.cfg.set("threads", threads)
+                self.cfg.set("worker_class", "gthread")
+                self.cfg.set("graceful_timeout", SHUTDOWN_TIMEOUT)
+                self.cfg.set("worker_exit", _worker_exit)
+
+            # runs in each worker after the fork, before it accepts connections
+            def load(self):
+                return create_app(host, port, barcode_index_path, threads)
+
+        print(f"Starting WebServer on http://{host}:{port} with gunicorn ({workers} workers x {threads} threads)")
+        Application().run()
+        return
+
+    app = create_app(host, port, barcode_index_path, threads)
+
+    # SIGTERM unwinds like Ctrl+C so the server is shut down below
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            print("Neither gunicorn nor waitress is installed; falling back to Flask's threaded server.")
+            app.run(host=host, port=port, threaded=True)
+            return
+        if workers > 1:
+            print(f"gunicorn is not available; serving from one process instead of {workers}.")
+        print(f"Starting WebServer on http://{host}:{port} with waitress ({threads} threads)")
+        waitress_serve(app, host=host, port=port, threads=threads)
+    finally:
+        _worker_exit()
+
 if __name__ == "__main__":
-  server = Server()
-  server.run()
\ No newline at end of file
+  if "--debug" in sys.argv:
+    Server().run(debug=True)
+  else:
+    serve()
\ No newline at end of file
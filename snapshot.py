@@ -0,0 +1,222 @@
+#COLUMNAR TABLE SNAPSHOTS
+#
+# A snapshot file holds a table's rows column by column, in row groups:
+#
+#   MAGIC
+#   row group 0: column 0 block, column 1 block, ...
+#   row group 1: ...
+#   footer (JSON: table definition and where every block is)
+#   footer length (uint64) + MAGIC
+#
+# Each column block starts with a null mask (1 byte per row). What follows depends
+# on the block's kind, chosen from its values and recorded in the footer:
+#
+#   "int"    rows int64 values (integers that fit)
+#   "float"  rows float64 values
+#   "bytes"  rows+1 uint64 offsets, then the values back to back
+#   "text"   as "bytes", the values' text as UTF-8 (anything else: str(value))
+#
+# so values load back as the same Python types they were read as. All numbers are
+# little-endian. Blocks are read straight out of a memory map, so opening a
+# snapshot copies nothing.
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = b"YCPSNAP1"
+_TRAILER = struct.Struct("<Q")
+_INT64_RANGE = range(-2**63, 2**63)
+
+def _le_bytes(values, typecode='Q'):
+  data = array(typecode, values)
+  if sys.byteorder != 'little':
+    data.byteswap()
+  return data.tobytes()
+
+def _le_array(buffer, typecode='Q'):
+  data = array(typecode)
+  data.frombytes(buffer)
+  if sys.byteorder != 'little':
+    data.byteswap()
+  return data
+
+# the block kind that holds every (non-NULL) value of a column without loss
+def _block_kind(values):
+  kinds = set()
+  for value in values:
+    if value is None:
+      continue
+    if isinstance(value, int) and not isinstance(value, bool) and value in _INT64_RANGE:
+      kinds.add("int")
+    elif isinstance(value, float):
+      kinds.add("float")
+    elif isinstance(value, (bytes, bytearray)):
+      kinds.add("bytes")
+    else:
+      kinds.add("text")
+  if len(kinds) == 1:
+    return kinds.pop()
+  # mixed blocks keep bytes intact; everything else goes as text
+  return "bytes" if "bytes" in kinds else "text"
+
+class SnapshotWriter():
+  def __init__(self, filename, table, columns, primary_key=()):
+    """
+    Writes a snapshot one row group at a time.
+
+    Args:
+        filename (str): The snapshot file to create.
+        table (str): Name of the table the rows come from.
+        columns (list): (name, mysql_type) pairs, in row order.
+        primary_key (tuple, optional): Primary key column names.
+    """
+    self.file = open(filename, 'wb')
+    self.file.write(MAGIC)
+    self.footer = {
+      "table": table,
+      "columns": [{"name": name, "type": col_type} for name, col_type in columns],
+      "primary_key": list(primary_key),
+      "rows": 0,
+      "row_groups": []
+    }
+
+  def write_row_group(self, rows):
+    """
+    Appends a row group. Each column is stored in the narrowest kind that holds
+    all its values (see the top of this file); None is NULL.
+    """
+    if not rows:
+      return
+    blocks = []
+    for col_index in range(len(self.footer["columns"])):
+      values = [row[col_index] for row in rows]
+      kind = _block_kind(values)
+      nulls = bytes(value is None for value in values)
+
+      start = self.file.tell()
+      self.file.write(nulls)
+      if kind == "int":
+        self.file.write(_le_bytes([0 if value is None else value for value in values], 'q'))
+      elif kind == "float":
+        self.file.write(_le_bytes([0.0 if value is None else value for value in values], 'd'))
+      else:
+        offsets = [0]
+        chunks = []
+        position = 0
+        for value in values:
+          if value is not None:
+            if not isinstance(value, (bytes, bytearray)):
+              value = str(value).encode('utf-8')
+            chunks.append(value)
+            position += len(value)
+          offsets.append(position)
+        self.file.write(_le_bytes(offsets))
+        for chunk in chunks:
+          self.file.write(chunk)
+      blocks.append({"offset": start, "length": self.file.tell() - start, "kind": kind})
+
+    self.footer["row_groups"].append({"rows": len(rows), "columns": blocks})
+    self.footer["rows"] += len(rows)
+
+  def close(self):
+    footer = json.dumps(self.footer).encode('utf-8')
+    self.file.write(footer)
+    self.file.write(_TRAILER.pack(len(footer)))
+    self.file.write(MAGIC)
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    if exc_type is None:
+      self.close()
+    else:
+      self.file.close()
+
+class SnapshotReader():
+  def __init__(self, filename):
+    """
+    Opens a snapshot through a read-only memory map.
+
+    Raises:
+        ValueError: If the file is not a complete snapshot.
+    """
+    self.file = open(filename, 'rb')
+    try:
+      self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      self.file.close()
+      raise ValueError(f"'{filename}' is empty, not a snapshot")
+    trailer_size = _TRAILER.size + len(MAGIC)
+    if (len(self.map) < len(MAGIC) + trailer_size or self.map[:len(MAGIC)] != MAGIC
+        or self.map[-len(MAGIC):] != MAGIC):
+      self.close()
+      raise ValueError(f"'{filename}' is not a snapshot, or was not written completely")
+    (footer_length,) = _TRAILER.unpack_from(self.map, len(self.map) - trailer_size)
+    footer_start = len(self.map) - trailer_size - footer_length
+    self.footer = json.loads(self.map[footer_start:footer_start + footer_length].decode('utf-8'))
+
+  @property
+  def table(self):
+    return self.footer["table"]
+
+  @property
+  def columns(self):
+    return [(column["name"], column["type"]) for column in self.footer["columns"]]
+
+  @property
+  def primary_key(self):
+    return self.footer["primary_key"]
+
+  @property
+  def row_count(self):
+    return self.footer["rows"]
+
+  def column_values(self, group_index, col_index):
+    """
+    Returns:
+        list: The column's values in a row group, as int, float, bytes or str
+              according to the block's kind (None for NULL).
+    """
+    group = self.footer["row_groups"][group_index]
+    rows = group["rows"]
+    block = group["columns"][col_index]
+    kind = block["kind"]
+    start = block["offset"]
+    values_start = start + rows
+    # views into the map must all be released before it can be closed
+    with memoryview(self.map) as view:
+      with view[start:values_start] as nulls:
+        if kind in ("int", "float"):
+          with view[values_start:values_start + rows * 8] as values_view:
+            values = _le_array(values_view, 'q' if kind == "int" else 'd')
+          return [None if nulls[i] else values[i] for i in range(rows)]
+
+        data_start = values_start + (rows + 1) * 8
+        with view[values_start:data_start] as offsets_view:
+          offsets = _le_array(offsets_view)
+        with view[data_start:data_start + offsets[rows]] as data:
+          if kind == "bytes":
+            return [None if nulls[i] else data[offsets[i]:offsets[i + 1]].tobytes() for i in range(rows)]
+          return [None if nulls[i] else str(data[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(rows)]
+
+  def iter_row_groups(self):
+    """
+    Generator yielding each row group as a list of row tuples.
+    """
+    for group_index in range(len(self.footer["row_groups"])):
+      columns = [self.column_values(group_index, col_index) for col_index in range(len(self.footer["columns"]))]
+      yield list(zip(*columns))
+
+  def close(self):
+    self.map.close()
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    self.close()
@@ -1,16 +1,138 @@
 #DATABASE INTERFACE
+import bisect
+import functools
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector import pooling
+
+import metrics
+from barcodes import canonical_gtin, gtin_text, is_barcode_type
+
+logger = logging.getLogger(__name__)
+
+_DB_CALL_SECONDS = metrics.REGISTRY.histogram(
+  "ycp_db_call_seconds", "Time spent in SQLInterface methods, connection checkout included.", ["method"])
+
+# default seconds between full reloads of the cached table metadata, which picks up
+# columns and keys changed by other processes
+SCHEMA_REFRESH_INTERVAL = 300
+
+# run an SQLInterface method on a connection checked out for the calling thread.
+# Nested calls (e.g. new_table -> list_tables) reuse the connection already held.
+# The outermost call is timed into _DB_CALL_SECONDS, under 'label' or else the method's
+# name, and into the calling request's DB time.
+def _uses_connection(method=None, *, label=None):
+  if method is None:
+    return functools.partial(_uses_connection, label=label)
+  name = label or method.__name__
+  @functools.wraps(method)
+  def wrapper(self, *args, **kwargs):
+    if getattr(self._local, 'timing', False):
+      with self.connection():
+        return method(self, *args, **kwargs)
+
+    self._local.timing = True
+    start = time.perf_counter()
+    try:
+      with self.connection():
+        return method(self, *args, **kwargs)
+    finally:
+      self._local.timing = False
+      elapsed = time.perf_counter() - start
+      _DB_CALL_SECONDS.observe(elapsed, name)
+      metrics.add_db_time(elapsed)
+  return wrapper
 
 class SQLInterface():
-  def __init__(self, host, name, username, password):
+  def __init__(self, host, name, username, password, pool_size=None, pool_timeout=30,
+               schema_refresh_interval=SCHEMA_REFRESH_INTERVAL,
+               barcode_columns=("code", "Barcode"), prepared_statements=False):
+    """
+    Args:
+        host (str): The MySQL server host.
+        name (str): The database to use (created on connect if missing).
+        username (str): The MySQL user.
+        password (str): The MySQL password.
+        pool_size (int, optional): When set, connect() opens a pool of this many
+                                   connections (max 32) and every method checks one
+                                   out for the duration of the call, so the interface
+                                   can be shared between request threads. When None,
+                                   a single shared connection is used. Defaults to None.
+        pool_timeout (int, optional): Seconds to wait for a free pooled connection
+                                      before giving up. Defaults to 30.
+        schema_refresh_interval (float, optional): Seconds after which the cached
+                                      table/column metadata is reloaded in full, or None
+                                      to only reload on demand. Defaults to
+                                      SCHEMA_REFRESH_INTERVAL (300).
+        barcode_columns (tuple, optional): Column names holding barcodes. Where such a
+                                      column is a BIGINT, imported values and lookup
+                                      keys are canonicalized to GTIN-14 (see barcodes.py),
+                                      and codes with a bad check digit are rejected.
+                                      Defaults to ("code", "Barcode").
+        prepared_statements (bool, optional): Run query(), query_many() and query_all() as
+                                      server-side prepared statements, prepared once
+                                      per connection and then executed over the binary
+                                      protocol with no reparsing. Defaults to False.
+    """
     self.host = host
     self.database_name = name
     self.username = username
     self.password = password
     self.table_list = []
-    
+
+    self.pool_size = pool_size
+    self.pool_timeout = pool_timeout
+    self.pool = None
+    self._pool_slots = None
+    self._pool_lock = threading.Lock()
+    self._pool_in_use = 0
+    self._local = threading.local()
+    self._db = None
+    self._cursor = None
+    self.write_listeners = []
+
+    self.schema_refresh_interval = schema_refresh_interval
+    self._schema = None # tablename -> {"columns", "types", "primary_key", "by_lower"}
+    self._schema_loaded_at = 0
+    self._missing_tables = {} # tablename -> time.monotonic() it was last looked up and not found
+    self._schema_lock = threading.Lock()
+    self._row_orders = {} # tablename -> _RowOrderIndex, built on first positional lookup
+    self.barcode_columns = {col.lower() for col in barcode_columns}
+
+    self.prepared_statements = prepared_statements
+    self._statements = {} # name -> SQL, see prepare_statement()
+    self._prepared = OrderedDict() # server connection id -> OrderedDict(SQL -> (SQL, prepared cursor)), most recent last
+    self._prepared_lock = threading.Lock()
+
+  # the connection used by the calling thread: its pooled checkout, or the single shared connection
+  @property
+  def db(self):
+    db = getattr(self._local, 'db', None)
+    return db if db is not None else self._db
+
+  @db.setter
+  def db(self, value):
+    self._db = value
+
+  @property
+  def cursor(self):
+    cursor = getattr(self._local, 'cursor', None)
+    return cursor if cursor is not None else self._cursor
+
+  @cursor.setter
+  def cursor(self, value):
+    self._cursor = value
+
   # establish a connection with the database. If it doesn't exist, create it.
+  # In pooled mode the bootstrap connection is closed once the pool is up.
+  # Pools are per process: call connect() again in every forked worker.
   def connect(self):
     try:
       self.db = mysql.connector.connect(
@@ -38,24 +160,429 @@ class SQLInterface():
           print(f"Connected to database '{self.database_name}'")
           print(f"Using {self.database_name}")
 
+        if self.pool_size:
+          self._create_pool()
+
     except Error as e:
       print(f"There was a problem connecting to the database: {e}")
+
+  def _create_pool(self):
+    self.pool = pooling.MySQLConnectionPool(
+      pool_name = f"{self.database_name}_pool",
+      pool_size = self.pool_size,
+      # connections are rolled back on return instead (see _release), which saves
+      # a COM_RESET_CONNECTION round trip on every checkout
+      pool_reset_session = False,
+      host = self.host,
+      user = self.username,
+      passwd = self.password,
+      database = self.database_name,
+      allow_local_infile=True
+    )
+    self._pool_slots = threading.BoundedSemaphore(self.pool_size)
+    self._cursor.close()
+    self._db.close()
+    self._cursor = None
+    self._db = None
+    print(f"Opened a pool of {self.pool_size} connections to '{self.database_name}'")
+
+  # take a connection from the pool, waiting up to pool_timeout for one to be free.
+  # Returns None (after printing why) if no healthy connection could be had.
+  def _checkout(self):
+    # MySQLConnectionPool raises instead of blocking when exhausted, so the
+    # semaphore makes callers queue for a free slot
+    if not self._pool_slots.acquire(timeout=self.pool_timeout):
+      print(f"Error: No pooled connection became free within {self.pool_timeout}s.")
+      return None
+
+    try:
+      conn = self.pool.get_connection()
+    except Error as e:
+      self._pool_slots.release()
+      print(f"Error: Could not get a pooled connection: {e}")
+      return None
+
+    try:
+      # health check: revive the connection if the server dropped it while idle
+      conn.ping(reconnect=True, attempts=3, delay=1)
+    except Error as e:
+      self._release(conn, None)
+      print(f"Error: Pooled connection is unusable and could not reconnect: {e}")
+      return None
+
+    with self._pool_lock:
+      self._pool_in_use += 1
+    return conn
+
+  # hand a connection back to the pool, ending any transaction it left open so the
+  # next borrower doesn't inherit it (or its stale REPEATABLE READ snapshot)
+  def _release(self, conn, cursor):
+    try:
+      if cursor is not None:
+        cursor.close()
+      if conn.in_transaction:
+        conn.rollback()
+    except Error as e:
+      print(f"Warning: Error while returning connection to the pool: {e}")
+    finally:
+      try:
+        conn.close() # returns it to the pool
+      except Error:
+        pass
+      self._pool_slots.release()
+
+  @contextmanager
+  def connection(self):
+    """
+    Binds a connection and cursor to the calling thread for the duration of the block,
+    so 'self.db' and 'self.cursor' refer to them.
+
+    In pooled mode a connection is checked out on entry and returned on exit; if
+    the thread already holds one (nested call), it is reused. Without a pool this
+    simply yields the single shared connection.
+
+    Yields:
+        The connection in use, or None if not connected.
+    """
+    if self.pool is None or getattr(self._local, 'db', None) is not None:
+      yield self.db
+      return
+
+    conn = self._checkout()
+    if conn is None:
+      yield None # callers see no cursor and report "Not connected"
+      return
+
+    # buffered, so a result left partly read can't block the next statement
+    cursor = conn.cursor(buffered=True)
+    self._local.db = conn
+    self._local.cursor = cursor
+    try:
+      yield conn
+    finally:
+      self._local.db = None
+      self._local.cursor = None
+      with self._pool_lock:
+        self._pool_in_use -= 1
+      self._release(conn, cursor)
+
+  def prepare_statement(self, name, sql):
+    """
+    Registers a named statement for execute_statement(). It is prepared on each
+    connection the first time that connection runs it.
+
+    Args:
+        name (str): The name to run it by, e.g. "store_list".
+        sql (str): The statement, with %s placeholders.
+    """
+    self._statements[name] = sql
+
+  @_uses_connection
+  def execute_statement(self, name, params=()):
+    """
+    Runs a statement registered with prepare_statement() as a prepared statement.
+
+    Returns:
+        list: The result rows, or None if an error occurs.
+    """
+    sql = self._statements.get(name)
+    if sql is None:
+      logger.error("No statement named '%s' has been prepared.", name)
+      return None
+    from mysql.connector import Error # Ensure Error is imported
+    try:
+      rows = self._run_prepared(sql, params)
+      if rows is None:
+        # not preparable here (or lost with a reconnect): run it as plain text
+        self.cursor.execute(sql, tuple(params))
+        rows = self.cursor.fetchall()
+    except Error as e:
+      logger.error("Database error while running statement '%s': %s", name, e)
+      return None
+    return rows
+
+  # run 'sql' on the calling thread's connection as a prepared statement, preparing
+  # it the first time this connection sees it. Returns the rows, or None if the
+  # statement can't be run this way so the caller should use the text protocol.
+  # Other errors (e.g. a missing table) are raised, as the text protocol would
+  # only fail the same way.
+  def _run_prepared(self, sql, params):
+    from mysql.connector import Error # Ensure Error is imported
+
+    conn = self.db
+    if conn is None:
+      return None
+    # statements live in the server session, which outlasts the wrapper the pool
+    # hands out for each checkout; a reconnect starts a new session with none
+    session = conn.connection_id
+    if session is None:
+      return None
+    with self._prepared_lock:
+      statements = self._prepared.get(session)
+      if statements is None:
+        statements = self._prepared[session] = OrderedDict()
+        while len(self._prepared) > _PREPARED_SESSIONS:
+          self._prepared.popitem(last=False) # most likely closed by a reconnect
+      else:
+        self._prepared.move_to_end(session)
+
+    # only the thread holding the connection touches its statements
+    entry = statements.get(sql)
+    try:
+      if entry is None:
+        # the cursor only reuses its statement when handed the very same string object
+        entry = statements[sql] = (sql, conn.cursor(prepared=True))
+        if len(statements) > _PREPARED_PER_CONNECTION:
+          _, (_, evicted) = statements.popitem(last=False)
+          evicted.close()
+      else:
+        statements.move_to_end(sql)
+      prepared_sql, cursor = entry
+      cursor.execute(prepared_sql, tuple(params))
+      return [tuple(value.decode('utf-8') if isinstance(value, bytearray) else value for value in row)
+              for row in cursor.fetchall()]
+    except Error as e:
+      statements.pop(sql, None)
+      if entry is not None:
+        try:
+          entry[1].close()
+        except Error:
+          pass
+      if e.errno == _ER_UNSUPPORTED_PS:
+        return None
+      raise
+
+  def add_write_listener(self, callback):
+    """
+    Registers a callback run as callback(tablename, changes) after this interface
+    commits a change to a table's rows or drops it, e.g. to invalidate caches
+    built on it.
+
+    'changes' lists the rows written as (before, after) pairs of column dicts:
+    (None, row) for an insert, ({key column: key}, None) for a delete, and
+    ({key column: old key}, {key column: key, **new values}) for an update. Barcode
+    values are canonical. It is None when the rows aren't known (imports, bulk
+    writes, drops), and the whole table should be treated as changed.
+    """
+    self.write_listeners.append(callback)
+
+  # row_change is (removed_key, added_key) for a single-row write whose primary keys
+  # are known (either may be None); a built row order index is patched rather than dropped.
+  # changes is passed on to the write listeners
+  def _notify_write(self, tablename, row_change=None, changes=None):
+    tablename = tablename.strip('`')
+    row_order = self._row_orders.get(tablename)
+    if row_order is not None:
+      try:
+        if row_change is None:
+          raise ValueError("untracked change")
+        removed_key, added_key = row_change
+        if removed_key is not None:
+          row_order.remove(removed_key)
+        if added_key is not None:
+          row_order.add(added_key)
+      except (ValueError, TypeError):
+        self._row_orders.pop(tablename, None) # rebuilt on next use
+
+    for callback in self.write_listeners:
+      try:
+        callback(tablename, changes)
+      except Exception as e:
+        print(f"Warning: Write listener failed for table '{tablename}': {e}")
+
+  # --- Schema metadata cache ---
+  # Table and column info is read from information_schema once and kept in memory,
+  # so existence and column checks don't cost a SHOW TABLES / SHOW COLUMNS round
+  # trip per call. A table that isn't cached is looked up again before being
+  # reported missing, which also picks up tables created by other processes.
+
+  @_uses_connection
+  def refresh_schema(self, tablename=None):
+        """
+        Reloads the cached table/column metadata from information_schema.
+
+        Args:
+            tablename (str, optional): Reload just this table. Defaults to None (all tables).
+        """
+        from mysql.connector import Error # Ensure Error is imported
+
+        if not self.cursor:
+            print("Error: Not connected to database. Call .connect() first.")
+            return
+
+        if tablename is not None and self._schema is None:
+            tablename = None # nothing cached yet, so load everything
+
+        columns_sql = ("SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS "
+                       "WHERE TABLE_SCHEMA = %s")
+        keys_sql = ("SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+                    "WHERE TABLE_SCHEMA = %s AND CONSTRAINT_NAME = 'PRIMARY'")
+        params = (self.database_name,)
+        if tablename is not None:
+            tablename = tablename.strip('`')
+            columns_sql += " AND TABLE_NAME = %s"
+            keys_sql += " AND TABLE_NAME = %s"
+            params += (tablename,)
+
+        try:
+            self.cursor.execute(columns_sql + " ORDER BY TABLE_NAME, ORDINAL_POSITION", params)
+            column_rows = self.cursor.fetchall()
+            self.cursor.execute(keys_sql + " ORDER BY TABLE_NAME, ORDINAL_POSITION", params)
+            key_rows = self.cursor.fetchall()
+        except Error as e:
+            print(f"Error loading table metadata: {e}")
+            return
+
+        tables = {}
+        for table, column, column_type in column_rows:
+            table, column, column_type = _as_str(table), _as_str(column), _as_str(column_type)
+            info = tables.setdefault(table, {"columns": [], "types": {}, "primary_key": [], "by_lower": {}})
+            info["columns"].append(column)
+            info["types"][column] = column_type
+            info["by_lower"][column.lower()] = column
+        for table, column in key_rows:
+            table, column = _as_str(table), _as_str(column)
+            if table in tables:
+                tables[table]["primary_key"].append(column)
+
+        self._store_schema(tablename, tables)
+
+  # install metadata read by refresh_schema: all tables, or just 'tablename'
+  def _store_schema(self, tablename, tables):
+    with self._schema_lock:
+      if tablename is None:
+        self._schema = tables
+        self._schema_loaded_at = time.monotonic()
+        self._missing_tables.clear()
+      else:
+        self._schema.pop(tablename, None)
+        self._schema.update(tables)
+        self._missing_tables.pop(tablename, None)
+
+  # the cached metadata for a table, or None if it does not exist. A table that
+  # isn't cached is looked up again, but at most every _MISSING_TABLE_TTL seconds,
+  # so checks for an absent table don't each cost a round trip
+  def _table_info(self, tablename):
+    tablename = tablename.strip('`')
+    stale = (self.schema_refresh_interval is not None and
+             time.monotonic() - self._schema_loaded_at > self.schema_refresh_interval)
+    if self._schema is None or stale:
+      self.refresh_schema()
+    if self._schema is None:
+      return None
+
+    info = self._schema.get(tablename)
+    if info is None:
+      missing_since = self._missing_tables.get(tablename)
+      if missing_since is not None and time.monotonic() - missing_since < _MISSING_TABLE_TTL:
+        return None
+      self.refresh_schema(tablename)
+      info = self._schema.get(tablename)
+      if info is None:
+        with self._schema_lock:
+          self._missing_tables[tablename] = time.monotonic()
+    return info
+
+  def _table_exists(self, tablename):
+    return self._table_info(tablename) is not None
+
+  # the column's name as stored (MySQL column names are case-insensitive), or None
+  def _column_name(self, tablename, column_name):
+    info = self._table_info(tablename)
+    if info is None:
+      return None
+    column = info["by_lower"].get(column_name.strip('`').lower())
+    if column is None:
+      # the table may have been altered since it was cached
+      self.refresh_schema(tablename)
+      info = self._schema.get(tablename.strip('`'))
+      column = info["by_lower"].get(column_name.strip('`').lower()) if info else None
+    return column
+
+  def barcode_key(self, tablename, column, value):
+    """
+    The value to look 'value' up by in a column: its GTIN-14 number if the column
+    holds canonical barcodes, otherwise the value unchanged.
+
+    Returns:
+        The key, or None if the column holds barcodes and 'value' isn't a valid one.
+    """
+    info = self._table_info(tablename)
+    if info is None or column.strip('`').lower() not in self.barcode_columns:
+      return value
+    name = info["by_lower"].get(column.strip('`').lower())
+    if name is None or not is_barcode_type(info["types"][name]):
+      return value
+    return canonical_gtin(value)
+
+  # a 'where' filter with its barcode values canonicalized, or None if one is invalid
+  def _barcode_where(self, tablename, where):
+    if not where:
+      return {}
+    keys = {col: self.barcode_key(tablename, col, value) for col, value in where.items()}
+    if any(keys[col] is None and where[col] is not None for col in where):
+      return None
+    return keys
+
+  # 'data' ({column: value}) with its values for canonical barcode columns replaced by
+  # their GTIN-14 keys. Raises ValueError naming the column if a barcode is invalid.
+  def _canonical_row(self, tablename, data):
+    row = {}
+    for col, value in data.items():
+      key = self.barcode_key(tablename, col, value) if value is not None else None
+      if key is None and value is not None:
+        raise ValueError(f"'{value}' is not a valid barcode for column '{col}'")
+      row[col] = key
+    return row
+
+  # the given columns of a table that hold canonical barcodes, which API replies
+  # write out as barcode text rather than GTIN-14 numbers
+  def _barcode_output_columns(self, tablename, column_names):
+    info = self._table_info(tablename)
+    if info is None:
+      return []
+    return [name for name in column_names
+            if name.lower() in self.barcode_columns and is_barcode_type(info["types"].get(name, ""))]
+
+  # which of an import's columns ({name: type}) take canonical barcodes
+  def _barcode_flags(self, columns_dict):
+    return [name.lower() in self.barcode_columns and is_barcode_type(col_type)
+            for name, col_type in columns_dict.items()]
+
+  def _forget_table(self, tablename):
+    with self._schema_lock:
+      if self._schema is not None:
+        self._schema.pop(tablename.strip('`'), None)
+
+  def pool_stats(self):
+    """
+    Returns:
+        dict: {'size': ..., 'in_use': ...} for the connection pool, or None when
+              running on a single connection.
+    """
+    if self.pool is None:
+      return None
+    with self._pool_lock:
+      return {"size": self.pool_size, "in_use": self._pool_in_use}
   
   # return a list of all tables in database
+  @_uses_connection
   def list_tables(self):
     self.cursor.execute(f"SHOW TABLES;")
     return self.cursor.fetchall()
   
   # if table does not exist, create it
+  @_uses_connection
   def new_table(self, name, cols):
-    tables = self.list_tables()
-    if (name) in tables:
+    if self._table_exists(name):
       print(f"The table '{name}' already exists.")
     else:
       self.cursor.execute(f"CREATE TABLE {name}({cols});")
+      self.refresh_schema(name)
       print(f"Created the table '{name}'.")
   
   # if table exists, delete it
+  @_uses_connection
   def delete_table(self, name):
         import mysql.connector # Ensure Error is imported for specific exception handling
         from mysql.connector import Error
@@ -68,21 +595,118 @@ class SQLInterface():
         # This handles cases where 'name' might be '1751290404' or 'My Table'
         sql_safe_table_name = f"`{name.strip('`')}`" # Strip existing backticks if any, then add them
         
-        tables = self.list_tables()
-        # list_tables returns unquoted names, so compare with the unquoted version of 'name'
-        if (name,) in tables:
+        if self._table_exists(name):
             try:
                 # Use the backticked table name in the DROP TABLE statement
                 self.cursor.execute(f"DROP TABLE {sql_safe_table_name};")
                 self.db.commit()
+                self._forget_table(name)
+                self._notify_write(name)
                 print(f"Deleted the table '{name}'.")
             except Error as e:
                 print(f"Error deleting table '{name}': {e}")
         else:
             print(f"The table '{name}' does not exist...")
             
+  # copy per-store tables (store_0, store_1, ...) into one shared table keyed on the store
+  @_uses_connection
+  def migrate_store_tables(self, target="approvals", prefix="store_", store_col="StoreID", drop=False):
+        """
+        Copies every '<prefix><id>' table into 'target', tagging each row with its
+        id in 'store_col'. The target must already exist with the source columns
+        plus 'store_col'. Rows already in the target are kept, so the migration can
+        be rerun after a failure.
+
+        Rows are written through insert_rows, so barcodes bound for a canonical
+        BIGINT column are canonicalized first; rows with an invalid barcode are
+        left behind and counted, rather than being cast to 0 by the server. A
+        table with rejected rows is not dropped.
+
+        Args:
+            target (str, optional): The consolidated table. Defaults to "approvals".
+            prefix (str, optional): Prefix of the per-store tables. Defaults to "store_".
+            store_col (str, optional): Target column holding the id. Defaults to "StoreID".
+            drop (bool, optional): Drop each source table once fully copied. Defaults to False.
+
+        Returns:
+            dict: Maps each store id to the rows copied for it, or None if an error occurs.
+        """
+        from mysql.connector import Error # Ensure Error is imported
+
+        if not self.cursor:
+            print("Error: Not connected to database. Call .connect() first.")
+            return None
+
+        target = target.strip('`')
+        if not self._table_exists(target):
+            print(f"Error: Table '{target}' does not exist in the database. Create it first.")
+            return None
+        target_store_col = self._column_name(target, store_col)
+        if target_store_col is None:
+            print(f"Error: Column '{store_col}' does not exist in table '{target}'.")
+            return None
+
+        source_tables = sorted(name for name in (_as_str(row[0]) for row in self.list_tables())
+                               if name.startswith(prefix) and name != target)
+        copied = {}
+        try:
+            for source in source_tables:
+                storeid = source[len(prefix):]
+                columns = self.get_column_names(source)
+                target_columns = [self._column_name(target, col) for col in columns]
+                if not columns or None in target_columns:
+                    print(f"Skipping '{source}': its columns {columns} are not all in '{target}'.")
+                    continue
+                source_sql = ", ".join([f"`{col}`" for col in columns])
+                self.cursor.execute(f"SELECT {source_sql} FROM `{source}`")
+                rows = ({target_store_col: storeid, **dict(zip(target_columns, row))} for row in self.cursor.fetchall())
+                result = self.insert_rows(target, rows, ignore=True)
+                if result is None:
+                    raise Error(msg=f"could not copy '{source}'")
+                copied[storeid] = result["affected_rows"]
+                rejected = result["skipped_rows"]
+                print(f"Copied {copied[storeid]} rows from '{source}' into '{target}' "
+                      f"({rejected} rejected for an invalid barcode).")
+                if drop and rejected:
+                    print(f"Keeping '{source}', as {rejected} of its rows were not copied.")
+                elif drop:
+                    self.delete_table(source)
+
+            self._notify_write(target)
+            return copied
+
+        except Error as e:
+            print(f"Error migrating store tables into '{target}': {e}")
+            self.db.rollback()
+            self._notify_write(target)
+            return None
+
   # function to import a CSV file and it's contents into a new database table
-  def import_csv(self, filename, tablename):
+  @_uses_connection
+  def import_csv(self, filename, tablename, batch_size=1000, commit_interval=10, infer_types=False):
+        """
+        Imports a CSV file into a new table, streaming it: rows are inserted in
+        batches as they are read, so memory use doesn't grow with the file size.
+
+        Every column is VARCHAR(255) unless 'infer_types' is set. Then a first
+        pass over the whole file picks the narrowest type every value fits (INT,
+        BIGINT, DOUBLE, DATE, VARCHAR or TEXT; values with leading zeros stay
+        text), so no later row can fail to fit after earlier batches are
+        committed. A barcode column (see barcode_columns) whose values are all
+        valid GTINs becomes a canonical BIGINT key. Empty values in non-text
+        columns are stored as NULL.
+
+        Args:
+            filename (str): The path to the CSV file. Its first row is the header.
+            tablename (str): The table to create and insert into.
+            batch_size (int, optional): Rows per executemany batch. Defaults to 1000.
+            commit_interval (int, optional): Batches per transaction. Defaults to 10.
+            infer_types (bool, optional): Infer column types from the data instead
+                                          of using VARCHAR(255) throughout. Defaults to False.
+
+        Returns:
+            dict: {'rows_imported': ..., 'rows_skipped': ...}, or None if the import failed.
+        """
         # Ensure 'csv' module is imported locally within the function if not globally available
         import csv
         from mysql.connector import Error # Import Error for specific exception handling
@@ -92,52 +716,55 @@ class SQLInterface():
             return
 
         try:
-            # First pass: Read header to determine table schema
-            with open(filename, 'r', encoding='utf-8') as file:
-                csv_reader_for_header = csv.reader(file)
-                header = [col.strip() for col in next(csv_reader_for_header)] # Read header and strip whitespace
-
-            # Construct column definitions for CREATE TABLE statement
-            # This will now retain spaces in column names, using backticks for proper SQL syntax.
-            column_definitions_for_create_table = []
-            for col_name in header:
-                # Retain spaces in column names, but ensure they are properly backticked.
-                # No more replacing spaces with underscores here.
-                column_definitions_for_create_table.append(f"`{col_name}` VARCHAR(255)") 
-
-            # Join the definitions into a single string for the CREATE TABLE statement
-            cols_string_for_new_table_method = ", ".join(column_definitions_for_create_table)
-
-            # Call self.new_table to create the table if it doesn't exist
-            self.new_table(tablename, cols_string_for_new_table_method)
-
-            # Second pass: Read data and insert into the table
-            with open(filename, 'r', encoding='utf-8') as file:
-                csv_reader_for_data = csv.reader(file)
-                next(csv_reader_for_data) # Skip header row again for data import
+            with open(filename, 'r', encoding='utf-8', newline='') as file:
+                csv_reader = csv.reader(file)
+                header = [col.strip() for col in next(csv_reader)] # Read header and strip whitespace
+
+                if infer_types:
+                    column_types = _infer_column_types(header, csv_reader, self.barcode_columns)
+                    # rewind for the import pass
+                    file.seek(0)
+                    csv_reader = csv.reader(file)
+                    next(csv_reader)
+                else:
+                    column_types = ["VARCHAR(255)"] * len(header)
+                barcode_flags = self._barcode_flags(dict(zip(header, column_types)))
+                rules = [('gtin', None) if flag else None for flag in barcode_flags] if any(barcode_flags) else None
+
+                # Construct column definitions for CREATE TABLE statement
+                # This will now retain spaces in column names, using backticks for proper SQL syntax.
+                column_definitions_for_create_table = [
+                    f"`{col_name}` {col_type}" for col_name, col_type in zip(header, column_types)
+                ]
+                cols_string_for_new_table_method = ", ".join(column_definitions_for_create_table)
+
+                # Call self.new_table to create the table if it doesn't exist
+                self.new_table(tablename, cols_string_for_new_table_method)
 
                 # Construct the INSERT statement dynamically using the original header names (with spaces)
                 # These names must exactly match the column names created in the table (which now have spaces).
-                columns_for_insert_statement = ", ".join([f"`{col.strip()}`" for col in header]) # Use original names, backticked
+                columns_for_insert_statement = ", ".join([f"`{col}`" for col in header]) # Use original names, backticked
                 placeholders = ", ".join(["%s"] * len(header))
                 insert_sql = f"INSERT INTO {tablename} ({columns_for_insert_statement}) VALUES ({placeholders})"
-                
-                data_to_insert = []
-                for row in csv_reader_for_data:
-                    # Basic validation: ensure row has the expected number of columns
-                    if len(row) != len(header):
-                        print(f"Warning: Skipping row due to column count mismatch: {row}")
-                        continue
-                    data_to_insert.append(tuple(row))
 
-                batch_size = 1000 
-                for i in range(0, len(data_to_insert), batch_size):
-                    batch = data_to_insert[i:i + batch_size]
+                nullable = [not col_type.startswith(("VARCHAR", "TEXT")) for col_type in column_types]
+                counts = {"rows_imported": 0, "rows_skipped": 0}
+                pending_batches = 0
+                for batch in _csv_batches(csv_reader, header, nullable, batch_size, counts, rules):
                     self.cursor.executemany(insert_sql, batch)
-                    self.db.commit() # Commit after each batch to save progress and free memory
+                    counts["rows_imported"] += len(batch)
+                    pending_batches += 1
+                    if pending_batches >= commit_interval:
+                        self.db.commit()
+                        pending_batches = 0
+                self.db.commit()
 
-            print(f"Successfully imported data from '{filename}' into table '{tablename}'.")
+            self._notify_write(tablename)
+            print(f"Successfully imported {counts['rows_imported']} rows from '{filename}' into table '{tablename}'.")
+            return counts
 
+        except StopIteration:
+            print(f"Error: CSV file '{filename}' is empty.")
         except FileNotFoundError:
             print(f"Error: CSV file not found at '{filename}'")
             self.db.rollback() 
@@ -147,10 +774,11 @@ class SQLInterface():
         except Exception as e:
             print(f"An unexpected error occurred during CSV import: {e}")
             self.db.rollback()
-          # function to import a large TSV file and its contents into a new database table
  
   # function to import a large TSV file and its contents into a new database table
-  def import_large_tsv(self, filename, tablename, columns_dict, batch_size=10000):
+  @_uses_connection
+  def import_large_tsv(self, filename, tablename, columns_dict, batch_size=10000, bulk_load=False,
+                       workers=1, writers=2, resume=False, checkpoint_file=None):
         """
         Imports specific columns from a large TSV file into a new table.
         This method is optimized for memory by streaming the file line-by-line.
@@ -161,12 +789,39 @@ class SQLInterface():
         *** NEW: This version uses "INSERT IGNORE" to silently skip
         *** rows that violate the PRIMARY KEY (duplicates).
 
+        With bulk_load=True the needed columns are first projected into a
+        temporary TSV which the server ingests with LOAD DATA LOCAL INFILE,
+        far faster than batched INSERTs. If the server refuses it (e.g.
+        local_infile is disabled) the row-by-row import runs instead.
+
+        With workers > 1 the file is split into line-aligned byte ranges that a
+        process pool parses and truncates in parallel, while 'writers' threads
+        insert the batches over their own connections. This assumes no quoted
+        field spans lines, and which of two duplicate keys is kept is not fixed.
+
+        The row-by-row import writes a checkpoint (byte offset and row counts)
+        after every committed batch and deletes it once the file is done. If an
+        import dies part way, run it again with resume=True: the existing table
+        is kept and reading restarts at the last checkpoint. A batch replayed
+        after a crash is harmless thanks to INSERT IGNORE.
+
         Args:
             filename (str): The path to the large .tsv file.
             tablename (str): The name of the table to create and insert data into.
             columns_dict (dict): A dictionary mapping column names to MySQL data types.
                                  The keys MUST match the header names.
             batch_size (int, optional): Number of rows to insert per batch. Defaults to 10000.
+            bulk_load (bool, optional): Try the LOAD DATA LOCAL INFILE path first. Defaults to False.
+            workers (int, optional): Parser processes for the parallel import. Defaults to 1 (sequential).
+            writers (int, optional): Concurrent insert connections for the parallel import. Defaults to 2.
+            resume (bool, optional): Continue an interrupted import into the existing
+                                     table from its checkpoint. Defaults to False.
+            checkpoint_file (str, optional): Where to keep the checkpoint. Defaults to
+                                             '<filename>.<tablename>.checkpoint'.
+
+        Returns:
+            dict: {'rows_loaded': ..., 'rows_skipped': ...} where skipped rows are
+                  duplicates or malformed lines, or None if the import failed.
         """
         import csv
         import os
@@ -204,23 +859,46 @@ class SQLInterface():
         unquoted_tablename = tablename.strip('`')
         sql_safe_tablename = f"`{unquoted_tablename}`"
 
+        if checkpoint_file is None:
+            checkpoint_file = f"{filename}.{unquoted_tablename}.checkpoint"
+        checkpoint = None
+
         print(f"Starting TSV import for '{filename}' into table '{unquoted_tablename}'.")
 
         try:
             # --- 1. Check if table exists and create it if not ---
-            tables_raw = self.list_tables()
-            existing_tables = {table[0] for table in tables_raw}
-
-            if unquoted_tablename in existing_tables:
-                print(f"Error: Table '{unquoted_tablename}' already exists. Please delete it first if you want to re-import.")
-                return
-            
-            # Create the table definition *directly* from columns_dict
-            col_definitions = [f"`{name}` {datatype}" for name, datatype in columns_dict.items()]
-            cols_string_for_new_table = ", ".join(col_definitions)
-            
-            print(f"Table '{unquoted_tablename}' not found. Creating it...")
-            self.new_table(unquoted_tablename, cols_string_for_new_table)
+            if self._table_exists(unquoted_tablename):
+                if not resume:
+                    print(f"Error: Table '{unquoted_tablename}' already exists. Please delete it first if you want to re-import,")
+                    print("or pass resume=True to continue an interrupted import.")
+                    return
+                checkpoint = _read_checkpoint(checkpoint_file)
+                if checkpoint is None:
+                    print(f"No checkpoint found at '{checkpoint_file}'. Replaying the whole file into the existing table.")
+                else:
+                    print(f"Resuming from byte {checkpoint['offset']} after {checkpoint['rows']} rows.")
+            else:
+                # Create the table definition *directly* from columns_dict
+                col_definitions = [f"`{name}` {datatype}" for name, datatype in columns_dict.items()]
+                cols_string_for_new_table = ", ".join(col_definitions)
+                
+                print(f"Table '{unquoted_tablename}' not found. Creating it...")
+                self.new_table(unquoted_tablename, cols_string_for_new_table)
+
+            if resume and (bulk_load or workers > 1):
+                print("Note: Resuming always uses the row-by-row import.")
+            elif bulk_load:
+                result = self._bulk_load_tsv(filename, unquoted_tablename, columns_dict)
+                if result is not None:
+                    self._notify_write(unquoted_tablename)
+                    return result
+                print("Falling back to row-by-row import...")
+
+            if workers > 1 and not resume:
+                result = self._parallel_import_tsv(filename, unquoted_tablename, columns_dict, batch_size, workers, writers)
+                if result is not None:
+                    self._notify_write(unquoted_tablename)
+                return result
             
             # --- 2. Prepare for Batch Insertion ---
             
@@ -231,14 +909,22 @@ class SQLInterface():
             insert_sql = f"INSERT IGNORE INTO {sql_safe_tablename} ({col_names}) VALUES ({placeholders})"
             # --- END KEY CHANGE ---
             
-            column_types_ordered = list(columns_dict.values())
+            truncation_rules = _compile_truncation_rules(columns_dict.values(), self._barcode_flags(columns_dict))
             batch_data = []
-            total_rows = 0
+            total_rows = checkpoint['rows'] if checkpoint else 0
+            rows_loaded = checkpoint['rows_loaded'] if checkpoint else 0
+            rows_malformed = checkpoint['rows_malformed'] if checkpoint else 0
 
             # --- 3. Process the Large File (One Pass) ---
             print(f"Streaming and processing '{filename}' (this may take a while)...")
-            with open(filename, 'r', encoding='utf-8', newline='') as f:
-                reader = csv.reader(f, delimiter='\t')
+            with open(filename, 'rb') as f:
+                # read the file as bytes so the offset of every line is known for checkpoints
+                position = {"offset": 0}
+                def lines():
+                    for raw_line in f:
+                        position["offset"] += len(raw_line)
+                        yield raw_line.decode('utf-8')
+                reader = csv.reader(lines(), delimiter='\t')
                 
                 indices_to_extract = []
                 
@@ -262,6 +948,10 @@ class SQLInterface():
                 except StopIteration:
                     print("Warning: File is empty.")
                     return
+
+                if checkpoint:
+                    f.seek(checkpoint['offset'])
+                    position["offset"] = checkpoint['offset']
                 
                 # --- Process data rows ---
                 for i, row in enumerate(reader):
@@ -274,25 +964,7 @@ class SQLInterface():
                             data_to_insert_list.append(row[index])
                         
                         ### --- TRUNCATION BLOCK --- ###
-                        for col_index, value in enumerate(data_to_insert_list):
-                            col_type = column_types_ordered[col_index].upper()
-                            try:
-                                if col_type.startswith('VARCHAR('):
-                                    limit = int(col_type.split('(')[1].split(')')[0])
-                                    if len(value) > limit:
-                                        data_to_insert_list[col_index] = value[:limit]
-                                elif col_type == 'TEXT':
-                                    value_bytes = value.encode('utf-8')
-                                    if len(value_bytes) > 65535:
-                                        truncated_bytes = value_bytes[:65535]
-                                        data_to_insert_list[col_index] = truncated_bytes.decode('utf-8', errors='ignore')
-                                elif col_type == 'MEDIUMTEXT':
-                                    value_bytes = value.encode('utf-8')
-                                    if len(value_bytes) > 16777215:
-                                        truncated_bytes = value_bytes[:16777215]
-                                        data_to_insert_list[col_index] = truncated_bytes.decode('utf-8', errors='ignore')
-                            except Exception as trunc_e:
-                                print(f"Warning: Could not apply truncation for row {i+1}, col {col_index}. Error: {trunc_e}")
+                        _truncate_values(data_to_insert_list, truncation_rules)
                         
                         data_to_insert = tuple(data_to_insert_list)
                         batch_data.append(data_to_insert)
@@ -301,25 +973,40 @@ class SQLInterface():
                     # --- This block now ONLY catches Python errors during row prep ---
                     except IndexError:
                         print(f"Warning: Skipping malformed row {i+1} (column index out of range). Row: {row}")
+                        rows_malformed += 1
+                    except ValueError:
+                        # an invalid barcode in a canonical barcode column
+                        rows_malformed += 1
                     except Exception as e:
                         print(f"Error preparing row {i+1}: {e}. Row data: {row}")
+                        rows_malformed += 1
                     
                     # --- BATCH INSERT LOGIC ---
                     # Moved this outside the inner try/except for clearer DB errors
                     if len(batch_data) >= batch_size:
                         self.cursor.executemany(insert_sql, batch_data)
+                        rows_loaded += max(self.cursor.rowcount, 0)
                         self.db.commit()
+                        _write_checkpoint(checkpoint_file, position["offset"], total_rows, rows_loaded, rows_malformed)
                         print(f"  ... Inserted {total_rows} rows (duplicates skipped)...")
                         batch_data = []
 
             # --- 4. Insert the Final Batch ---
             if batch_data:
                 self.cursor.executemany(insert_sql, batch_data)
+                rows_loaded += max(self.cursor.rowcount, 0)
                 self.db.commit()
                 print(f"Inserted final batch.")
 
+            if os.path.exists(checkpoint_file):
+                os.remove(checkpoint_file)
+
+            self._notify_write(unquoted_tablename)
             print(f"Successfully imported {total_rows} rows from '{filename}' into table '{unquoted_tablename}'.")
             print("Duplicate rows were ignored and not imported.")
+            rows_skipped = total_rows - rows_loaded + rows_malformed
+            print(f"Rows loaded: {rows_loaded}, rows skipped: {rows_skipped}")
+            return {"rows_loaded": rows_loaded, "rows_skipped": rows_skipped}
 
         except csv.Error as e:
             print(f"A CSV parsing error occurred: {e}")
@@ -332,6 +1019,243 @@ class SQLInterface():
             print(f"An unexpected error occurred: {e}")
             self.db.rollback()
   
+  # LOAD DATA LOCAL INFILE path for import_large_tsv. Returns the same report dict,
+  # or None if the server rejected the load so the caller can fall back.
+  def _bulk_load_tsv(self, filename, tablename, columns_dict):
+        import csv
+
+        truncation_rules = _compile_truncation_rules(columns_dict.values(), self._barcode_flags(columns_dict))
+        counts = {"malformed": 0}
+
+        with open(filename, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f, delimiter='\t')
+            try:
+                header = [h.strip() for h in next(reader)]
+            except StopIteration:
+                print("Warning: File is empty.")
+                return {"rows_loaded": 0, "rows_skipped": 0}
+
+            header_map = {col_name: index for index, col_name in enumerate(header)}
+            missing = [col_name for col_name in columns_dict.keys() if col_name not in header_map]
+            if missing:
+                print(f"Error: Required column(s) {missing} not found in the TSV header.")
+                return None
+            indices_to_extract = [header_map[col_name] for col_name in columns_dict.keys()]
+
+            # --- 1. Project the needed columns, truncated to fit ---
+            def projected_rows():
+                for row in reader:
+                    if not row:
+                        continue
+                    try:
+                        values = _truncate_values([row[index] for index in indices_to_extract], truncation_rules)
+                    except (IndexError, ValueError):
+                        counts["malformed"] += 1
+                        continue
+                    yield values
+
+            # --- 2. Let the server ingest them in one statement ---
+            print(f"Projecting {list(columns_dict.keys())} into a temporary TSV...")
+            result = self._load_rows_infile(tablename, list(columns_dict.keys()), projected_rows())
+
+        if result is None:
+            return None
+        rows_written, rows_loaded = result
+        rows_skipped = rows_written - rows_loaded + counts["malformed"]
+        print(f"Successfully bulk loaded '{filename}' into table '{tablename}'.")
+        print(f"Rows loaded: {rows_loaded}, rows skipped: {rows_skipped} (duplicates or malformed)")
+        return {"rows_loaded": rows_loaded, "rows_skipped": rows_skipped}
+
+  # write rows (lists of str, None for NULL) to a temporary TSV and load it with
+  # LOAD DATA LOCAL INFILE ... IGNORE. Returns (rows_written, rows_loaded), or None
+  # if the server rejected the load.
+  def _load_rows_infile(self, tablename, column_names, rows):
+        import os
+        import tempfile
+        from mysql.connector import Error # Ensure Error is imported
+
+        rows_written = 0
+        temp = tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.tsv', delete=False)
+        try:
+            with temp:
+                for values in rows:
+                    temp.write('\t'.join('\\N' if value is None else value.translate(_LOAD_DATA_ESCAPES) for value in values))
+                    temp.write('\n')
+                    rows_written += 1
+
+            col_names = ', '.join([f"`{name}`" for name in column_names])
+            load_sql = (f"LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE `{tablename.strip('`')}` "
+                        "CHARACTER SET utf8mb4 "
+                        "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+                        f"LINES TERMINATED BY '\\n' ({col_names})")
+            print(f"Loading {rows_written} rows with LOAD DATA LOCAL INFILE...")
+            try:
+                self.cursor.execute(load_sql, (temp.name,))
+                rows_loaded = max(self.cursor.rowcount, 0)
+                self.db.commit()
+            except Error as e:
+                print(f"LOAD DATA LOCAL INFILE was rejected: {e}")
+                self.db.rollback()
+                return None
+            return rows_written, rows_loaded
+
+        finally:
+            os.remove(temp.name)
+
+  # parallel path for import_large_tsv: a process pool parses line-aligned byte ranges
+  # and writer threads insert the batches. Returns the report dict, or None on failure.
+  def _parallel_import_tsv(self, filename, tablename, columns_dict, batch_size, workers, writers):
+        import collections
+        import csv
+        import multiprocessing
+        import queue
+        from concurrent.futures import ProcessPoolExecutor
+
+        # --- 1. Read the header here; workers only ever see data lines ---
+        with open(filename, 'rb') as f:
+            header_line = f.readline()
+            data_start = f.tell()
+        header = [h.strip() for h in next(csv.reader([header_line.decode('utf-8')], delimiter='\t'), [])]
+        if not header:
+            print("Warning: File is empty.")
+            return {"rows_loaded": 0, "rows_skipped": 0}
+
+        header_map = {col_name: index for index, col_name in enumerate(header)}
+        missing = [col_name for col_name in columns_dict.keys() if col_name not in header_map]
+        if missing:
+            print(f"Error: Required column(s) {missing} not found in the TSV header.")
+            return None
+        indices_to_extract = [header_map[col_name] for col_name in columns_dict.keys()]
+        truncation_rules = _compile_truncation_rules(columns_dict.values(), self._barcode_flags(columns_dict))
+        ranges = _split_line_ranges(filename, data_start, _PARALLEL_RANGE_BYTES)
+
+        col_names = ', '.join([f"`{name}`" for name in columns_dict.keys()])
+        placeholders = ', '.join(['%s'] * len(columns_dict))
+        insert_sql = f"INSERT IGNORE INTO `{tablename}` ({col_names}) VALUES ({placeholders})"
+
+        # --- 2. Writer stage: each thread inserts over its own connection ---
+        # (the parser processes are spawned, not forked, as forking a process that
+        # has threads running can copy locks they hold into the child)
+        interfaces = self._worker_interfaces(writers)
+        batches = queue.Queue(maxsize=writers * 2)
+        counts = {"rows_loaded": 0}
+        errors = []
+        counts_lock = threading.Lock()
+
+        def write(interface):
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    return
+                if errors:
+                    continue # keep draining so the parser side never blocks
+                try:
+                    loaded = interface._insert_batch(insert_sql, batch)
+                    with counts_lock:
+                        counts["rows_loaded"] += loaded
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(interface,), daemon=True) for interface in interfaces]
+        for thread in threads:
+            thread.start()
+
+        # --- 3. Parse stage: at most two ranges per process in flight, to bound memory ---
+        total_rows = 0
+        rows_malformed = 0
+        print(f"Parsing {len(ranges)} ranges of '{filename}' with {workers} processes and {len(interfaces)} writers...")
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                pending = collections.deque()
+
+                def collect():
+                    nonlocal total_rows, rows_malformed
+                    rows, malformed = pending.popleft().result()
+                    total_rows += len(rows)
+                    rows_malformed += malformed
+                    for i in range(0, len(rows), batch_size):
+                        batches.put(rows[i:i + batch_size])
+                    print(f"  ... Parsed {total_rows} rows...")
+
+                for start, end in ranges:
+                    if errors:
+                        break
+                    pending.append(executor.submit(_parse_tsv_range, filename, start, end, indices_to_extract, truncation_rules))
+                    if len(pending) >= workers * 2:
+                        collect()
+                while pending:
+                    collect()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            for _ in threads:
+                batches.put(None)
+            for thread in threads:
+                thread.join()
+            for interface in interfaces:
+                if interface is not self:
+                    interface.close()
+
+        if errors:
+            print(f"An error occurred during the parallel import: {errors[0]}")
+            return None
+
+        rows_loaded = counts["rows_loaded"]
+        rows_skipped = total_rows - rows_loaded + rows_malformed
+        print(f"Successfully imported {total_rows} rows from '{filename}' into table '{tablename}'.")
+        print(f"Rows loaded: {rows_loaded}, rows skipped: {rows_skipped} (duplicates or malformed)")
+        return {"rows_loaded": rows_loaded, "rows_skipped": rows_skipped}
+
+  # run one INSERT batch in its own transaction; returns the rows inserted. Writer
+  # threads call it directly, so their time is recorded under the public import_large_tsv
+  @_uses_connection(label="import_large_tsv")
+  def _insert_batch(self, insert_sql, batch):
+        self.cursor.executemany(insert_sql, batch)
+        loaded = max(self.cursor.rowcount, 0)
+        self.db.commit()
+        return loaded
+
+  # interfaces for 'count' worker threads that must each use their own connection:
+  # this one when the pool can serve them all alongside the caller, else new connections
+  def _worker_interfaces(self, count):
+    if self.pool is not None and self.pool_size > count:
+      return [self] * count
+    interfaces = []
+    for _ in range(count):
+      worker = SQLInterface(self.host, self.database_name, self.username, self.password)
+      worker.connect()
+      interfaces.append(worker)
+    return interfaces
+
+  def close(self):
+    """
+    Closes the single connection, or every connection of the pool. Pooled
+    connections still in use are waited for, up to pool_timeout in all.
+    """
+    with self._prepared_lock:
+      self._prepared.clear()
+    if self.pool is not None:
+      pool, self.pool = self.pool, None # new calls now see no connection
+      # check each connection out and disconnect it for good; ones in use are
+      # handed back to the old pool and picked up here when their call ends
+      deadline = time.monotonic() + self.pool_timeout
+      for _ in range(self.pool_size):
+        if not self._pool_slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+          print("Warning: Pooled connections still in use were left open.")
+          break
+        try:
+          pool.get_connection().disconnect()
+        except Error:
+          pass
+    if self._db is not None:
+      try:
+        self._db.close()
+      except Error:
+        pass
+      self._db = None
+      self._cursor = None
+
+  @_uses_connection
   def insert_row(self, tablename, data):
         """
         Inserts a new row into the specified table.
@@ -351,11 +1275,16 @@ class SQLInterface():
         sql_safe_tablename = f"`{tablename.strip('`')}`"
 
         # Check if the table exists
-        self.cursor.execute(f"SHOW TABLES LIKE '{tablename.strip('`')}';")
-        if not self.cursor.fetchone():
+        if not self._table_exists(tablename):
             print(f"Error: Table '{tablename}' does not exist. Cannot insert row.")
             return
 
+        try:
+            data = self._canonical_row(tablename, data)
+        except ValueError as e:
+            print(f"Error inserting row into table '{tablename}': {e}")
+            return
+
         # Dynamically build the INSERT SQL query
         # Backtick column names to handle spaces or special characters
         columns = ", ".join([f"`{col.strip()}`" for col in data.keys()])
@@ -367,6 +1296,9 @@ class SQLInterface():
         try:
             self.cursor.execute(insert_sql, values)
             self.db.commit()
+            primary_key_column = self._primary_key_column(tablename)
+            added_key = _value_for_column(data, primary_key_column)
+            self._notify_write(tablename, None if added_key is None else (None, added_key), [(None, data)])
             print(f"Successfully inserted a new row into table '{tablename}'.")
         except Error as e:
             print(f"Error inserting row into table '{tablename}': {e}")
@@ -375,6 +1307,124 @@ class SQLInterface():
             print(f"An unexpected error occurred during row insertion: {e}")
             self.db.rollback()
   
+  @_uses_connection
+  def insert_rows(self, tablename, rows, batch_size=1000, ignore=False):
+        """
+        Inserts many rows using multi-row INSERT statements, one transaction per batch.
+
+        Args:
+            tablename (str): The name of the table to insert into.
+            rows (iterable): Dictionaries of column name -> value, all with the same keys
+                             as the first one (rows that differ are skipped).
+                             Example: [{'StoreID': '0', 'Name': 'Weis'}, {'StoreID': '1', 'Name': 'Lidl'}]
+            batch_size (int, optional): Rows per statement/transaction. Defaults to 1000.
+            ignore (bool, optional): Use INSERT IGNORE to skip duplicate keys. Defaults to False.
+
+        Returns:
+            dict: {'rows': rows sent, 'affected_rows': rows inserted, 'skipped_rows': rows
+                  with mismatched keys or an invalid barcode, 'batches': ...}, or None if
+                  the write failed (batches before the failing one stay committed).
+        """
+        verb = "INSERT IGNORE" if ignore else "INSERT"
+        return self._write_rows(tablename, rows, batch_size, verb, upsert=False)
+
+  @_uses_connection
+  def upsert_rows(self, tablename, rows, batch_size=1000):
+        """
+        Inserts many rows, updating the existing row instead wherever the primary
+        (or a unique) key already exists, using multi-row
+        'INSERT ... ON DUPLICATE KEY UPDATE' statements, one transaction per batch.
+
+        Args:
+            tablename (str): The name of the table to write to.
+            rows (iterable): Dictionaries of column name -> value, all with the same keys
+                             as the first one (rows that differ are skipped).
+            batch_size (int, optional): Rows per statement/transaction. Defaults to 1000.
+
+        Returns:
+            dict: {'rows': rows sent, 'affected_rows': ..., 'skipped_rows': ..., 'batches': ...},
+                  where MySQL counts 1 affected row per insert and 2 per changed row,
+                  or None if the write failed (batches before the failing one stay committed).
+        """
+        return self._write_rows(tablename, rows, batch_size, "INSERT", upsert=True)
+
+  # the body of insert_rows/upsert_rows, on the connection they hold
+  def _write_rows(self, tablename, rows, batch_size, verb, upsert):
+        from mysql.connector import Error # Ensure Error is imported
+
+        if not self.cursor:
+            print("Error: Not connected to database. Call .connect() first.")
+            return None
+
+        if not self._table_exists(tablename):
+            print(f"Error: Table '{tablename}' does not exist. Cannot insert rows.")
+            return None
+
+        sql_safe_tablename = f"`{tablename.strip('`')}`"
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return {"rows": 0, "affected_rows": 0, "skipped_rows": 0, "batches": 0}
+
+        columns = list(first.keys())
+        column_set = set(columns)
+        columns_sql = ", ".join([f"`{col.strip()}`" for col in columns])
+        row_placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        update_sql = ""
+        if upsert:
+            update_sql = " ON DUPLICATE KEY UPDATE " + ", ".join([f"`{col.strip()}` = VALUES(`{col.strip()}`)" for col in columns])
+
+        counts = {"rows": 0, "affected_rows": 0, "skipped_rows": 0, "batches": 0}
+        # the rows written, for the write listeners, unless there are too many to be
+        # worth patching caches with or INSERT IGNORE may have kept other values
+        written = [] if verb != "INSERT IGNORE" else None
+
+        def flush(batch):
+            values = [value for row in batch for value in row]
+            self.cursor.execute(f"{verb} INTO {sql_safe_tablename} ({columns_sql}) VALUES "
+                                + ", ".join([row_placeholders] * len(batch)) + update_sql, tuple(values))
+            counts["affected_rows"] += max(self.cursor.rowcount, 0)
+            self.db.commit()
+            counts["rows"] += len(batch)
+            counts["batches"] += 1
+
+        try:
+            batch = []
+            for row in itertools.chain([first], rows):
+                if set(row.keys()) != column_set:
+                    print(f"Warning: Skipping row whose columns don't match {columns}: {row}")
+                    counts["skipped_rows"] += 1
+                    continue
+                try:
+                    row = self._canonical_row(tablename, row)
+                except ValueError as e:
+                    print(f"Warning: Skipping row: {e}")
+                    counts["skipped_rows"] += 1
+                    continue
+                batch.append(tuple(row[col] for col in columns))
+                if written is not None and len(written) < _NOTIFY_ROWS_MAX:
+                    written.append(row)
+                else:
+                    written = None
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+        except Error as e:
+            print(f"Error writing rows to table '{tablename}' after {counts['batches']} committed batch(es): {e}")
+            self.db.rollback()
+            written = None # some batches may have been committed
+            return None
+        finally:
+            if counts["batches"]:
+                self._notify_write(tablename, None, None if written is None else [(None, row) for row in written])
+
+        print(f"Wrote {counts['rows']} row(s) to table '{tablename}' in {counts['batches']} batch(es) "
+              f"({counts['affected_rows']} affected).")
+        return counts
+
+  @_uses_connection
   def modify_row(self, tablename, primary_key_column, primary_key_value, data):
         """
         Modifies a specified row in the table based on a primary key.
@@ -396,11 +1446,17 @@ class SQLInterface():
         sql_safe_tablename = f"`{tablename.strip('`')}`"
 
         # Check if the table exists
-        self.cursor.execute(f"SHOW TABLES LIKE '{tablename.strip('`')}';")
-        if not self.cursor.fetchone():
+        if not self._table_exists(tablename):
             print(f"Error: Table '{tablename}' does not exist. Cannot modify row.")
             return
 
+        try:
+            data = self._canonical_row(tablename, data)
+            primary_key_value = self._canonical_row(tablename, {primary_key_column: primary_key_value})[primary_key_column]
+        except ValueError as e:
+            print(f"Error modifying row in table '{tablename}': {e}")
+            return
+
         # Dynamically build the SET part of the UPDATE query
         # Backtick column names to handle spaces or special characters
         set_clauses = ", ".join([f"`{col.strip()}` = %s" for col in data.keys()])
@@ -416,8 +1472,26 @@ class SQLInterface():
 
         try:
             self.cursor.execute(update_sql, tuple(values))
+            modified = self.cursor.rowcount # read before the write listeners reuse the cursor
             self.db.commit()
-            if self.cursor.rowcount > 0:
+            # the row order index only changes if the row's actual primary key was rewritten
+            actual_pk_column = self._primary_key_column(tablename)
+            by_primary_key = actual_pk_column is not None and actual_pk_column.lower() == primary_key_column.strip('`').lower()
+            new_key = _value_for_column(data, actual_pk_column)
+            if new_key is None or modified == 0:
+                row_change = (None, None)
+            elif by_primary_key:
+                row_change = (primary_key_value, new_key)
+            else:
+                row_change = None
+            changes = None # any number of rows may have matched
+            if modified == 0:
+                changes = []
+            elif by_primary_key:
+                before = {actual_pk_column: primary_key_value}
+                changes = [(before, dict(before, **data))]
+            self._notify_write(tablename, row_change, changes)
+            if modified > 0:
                 print(f"Successfully modified row in table '{tablename}' where {primary_key_column} = '{primary_key_value}'.")
             else:
                 print(f"No row found or modified in table '{tablename}' where {primary_key_column} = '{primary_key_value}'.")
@@ -428,27 +1502,42 @@ class SQLInterface():
             print(f"An unexpected error occurred during row modification: {e}")
             self.db.rollback() 
   
+  @_uses_connection
   def get_row(self, tablename, index):
         from mysql.connector import Error 
 
         if not self.cursor:
-            print("DEBUG (get_row_by_index): Not connected to database.")
+            logger.debug("get_row_by_index: Not connected to database.")
             return [] 
 
         if not isinstance(index, int) or index < 0:
-            print("DEBUG (get_row_by_index): Invalid index type or value.")
+            logger.debug("get_row_by_index: Invalid index type or value.")
             print("Error: Row index must be a non-negative integer.")
             return []
 
         sql_safe_tablename = f"`{tablename.strip('`')}`"
 
         try:
-            self.cursor.execute(f"SHOW TABLES LIKE '{tablename.strip('`')}';")
-            table_exists_result = self.cursor.fetchone()
-            if not table_exists_result:
-                print(f"DEBUG (get_row_by_index): SHOW TABLES LIKE returned empty for '{tablename}'.")
+            if not self._table_exists(tablename):
+                logger.debug("get_row_by_index: No cached table metadata for '%s'.", tablename)
                 print(f"Error: Table '{tablename}' does not exist in the database.")
                 return [] 
+
+            # Rows are positioned in primary key order (see find_row_index): look up
+            # the key at 'index' in memory and fetch that row by key, instead of
+            # making the server walk 'index' rows with OFFSET. A key that is gone
+            # means another process changed the table, so the index is rebuilt once
+            if self._primary_key_column(tablename) is not None:
+                for attempt in range(2):
+                    row_order = self._row_order_index(tablename)
+                    key = row_order.key_at(index) if row_order is not None else None
+                    if key is None:
+                        print(f"Row at index {index} not found in table '{tablename}'.")
+                        return None
+                    row = self.get_row_by_key(tablename, key)
+                    if row is not None or attempt:
+                        return row
+                    self._row_orders.pop(tablename.strip('`'), None)
             
             select_sql = f"SELECT * FROM {sql_safe_tablename} LIMIT 1 OFFSET {index};"
             self.cursor.execute(select_sql)
@@ -463,23 +1552,135 @@ class SQLInterface():
                 final_return_value = list(row_content) 
                 return final_return_value
             else:
-                print(f"DEBUG (get_row): Row at index {index} was NOT found (row_content is None).")
+                logger.debug("get_row: Row at index %s was NOT found (row_content is None).", index)
                 print(f"Row at index {index} not found in table '{tablename}'.")
                 return None 
 
         except Error as e:
-            print(f"DEBUG (get_row): Database Error: {e}")
+            logger.debug("get_row: Database Error: %s", e)
             print(f"Error retrieving row from table '{tablename}' at index {index}: {e}")
             try: self.cursor.fetchall()
             except: pass 
             return None
         except Exception as e:
-            print(f"DEBUG (get_row_by_index): Unexpected Error: {e}")
+            logger.debug("get_row_by_index: Unexpected Error: %s", e)
             print(f"An unexpected error occurred while retrieving row: {e}")
             try: self.cursor.fetchall()
             except: pass 
             return None
   
+  @_uses_connection
+  def get_row_by_key(self, tablename, key):
+        """
+        Retrieves the row with the given primary key value.
+
+        Args:
+            tablename (str): The name of the table.
+            key: The primary key value of the row. A barcode key is matched by its
+                 canonical form, as in the other key lookups.
+
+        Returns:
+            list: The row's values in column order, or None if not found, the key
+                  is not a valid barcode, or on error.
+        """
+        from mysql.connector import Error # Ensure Error is imported
+
+        if not self.cursor:
+            print("Error: Not connected to database. Call .connect() first.")
+            return None
+
+        primary_key_column = self._primary_key_column(tablename)
+        if primary_key_column is None:
+            print(f"Error: Could not determine primary key for table '{tablename}'.")
+            return None
+
+        lookup_key = self.barcode_key(tablename, primary_key_column, key)
+        if lookup_key is None:
+            print(f"Error: '{key}' is not a valid barcode for column '{primary_key_column}'.")
+            return None
+
+        sql_safe_tablename = f"`{tablename.strip('`')}`"
+        select_sql = f"SELECT * FROM {sql_safe_tablename} WHERE `{primary_key_column}` = %s;"
+
+        try:
+            self.cursor.execute(select_sql, (lookup_key,))
+            row_content = self.cursor.fetchone()
+            self.cursor.fetchall() # Consume any remaining results
+
+            if row_content:
+                return list(row_content)
+            print(f"Row with key '{key}' not found in table '{tablename}'.")
+            return None
+
+        except Error as e:
+            print(f"Error retrieving row with key '{key}' from table '{tablename}': {e}")
+            try: self.cursor.fetchall()
+            except: pass
+            return None
+
+  @_uses_connection
+  def delete_rows_by_keys(self, tablename, keys, batch_size=1000):
+        """
+        Deletes the rows with the given primary key values in one transaction,
+        using 'DELETE ... WHERE key IN (...)' statements of up to 'batch_size' keys.
+
+        Args:
+            tablename (str): The name of the table.
+            keys (iterable): Primary key values of the rows to delete.
+            batch_size (int, optional): Keys per DELETE statement. Defaults to 1000.
+
+        Returns:
+            int: The number of rows deleted, or -1 if an error occurs.
+        """
+        from mysql.connector import Error # Ensure Error is imported
+
+        if not self.cursor:
+            print("Error: Not connected to database. Call .connect() first.")
+            return -1
+
+        primary_key_column = self._primary_key_column(tablename)
+        if primary_key_column is None:
+            print(f"Error: Could not determine primary key for table '{tablename}'. Cannot delete by key.")
+            return -1
+
+        # keys in a barcode column are matched by their canonical form; invalid ones match nothing
+        keys = [self.barcode_key(tablename, primary_key_column, key) for key in dict.fromkeys(keys)]
+        keys = list(dict.fromkeys(key for key in keys if key is not None))
+        sql_safe_tablename = f"`{tablename.strip('`')}`"
+        deleted = 0
+
+        try:
+            for i in range(0, len(keys), batch_size):
+                batch = keys[i:i + batch_size]
+                placeholders = ", ".join(["%s"] * len(batch))
+                self.cursor.execute(f"DELETE FROM {sql_safe_tablename} WHERE `{primary_key_column}` IN ({placeholders});", tuple(batch))
+                deleted += max(self.cursor.rowcount, 0)
+            self.db.commit()
+        except Error as e:
+            print(f"Database error deleting rows by key from table '{tablename}': {e}")
+            self.db.rollback()
+            return -1
+
+        # patch the row order index; if it can't be patched, or the keys given don't
+        # account for every deleted row (e.g. they differ in case), let it be rebuilt
+        row_order = self._row_orders.get(tablename.strip('`'))
+        if row_order is not None:
+            try:
+                removed = 0
+                for key in keys:
+                    if row_order.position(key) != -1:
+                        row_order.remove(key)
+                        removed += 1
+                if removed != deleted:
+                    raise ValueError("untracked change")
+            except ValueError:
+                self._row_orders.pop(tablename.strip('`'), None)
+        self._notify_write(tablename, (None, None), [({primary_key_column: key}, None) for key in keys])
+
+        print(f"Deleted {deleted} row(s) from table '{tablename}'.")
+        return deleted
+
+  @_uses_connection
   def get_row_count(self, tablename):
         """
         Retrieves the total number of rows in a specified table.
@@ -529,6 +1730,7 @@ class SQLInterface():
             except: pass
             return -1 
   
+  @_uses_connection
   def get_column_data(self, tablename, column_name):
         # Retrieves all data from a specified column in a table.
         from mysql.connector import Error # Ensure Error is imported for specific exception handling
@@ -543,21 +1745,14 @@ class SQLInterface():
 
         try:
             # 1. Check if the table exists
-            self.cursor.execute(f"SHOW TABLES LIKE '{tablename.strip('`')}';")
-            # Consume the result immediately
-            if not self.cursor.fetchone():
+            if not self._table_exists(tablename):
                 print(f"Error: Table '{tablename}' does not exist in the database.")
                 return []
-            self.cursor.fetchall() # Ensure cursor is clear for next query
 
             # 2. Check if the column exists within the table
-            # Using SHOW COLUMNS FROM is more robust than SELECT ... LIMIT 0 for column existence
-            self.cursor.execute(f"SHOW COLUMNS FROM {sql_safe_tablename} LIKE '{column_name.strip('`')}';")
-            # Consume the result immediately
-            if not self.cursor.fetchone():
+            if not self._column_name(tablename, column_name):
                 print(f"Error: Column '{column_name}' does not exist in table '{tablename}'.")
                 return []
-            self.cursor.fetchall() # Ensure cursor is clear for next query
 
             # 3. Select all data from the specified column
             select_sql = f"SELECT {sql_safe_column_name} FROM {sql_safe_tablename};"
@@ -593,55 +1788,144 @@ class SQLInterface():
             return [] 
   
   # return the row index
+  @_uses_connection
   def find_row_index(self, tablename, column_name, key_value):
+        """
+        Finds the position of the first row whose 'column_name' equals 'key_value'.
+
+        Rows are positioned in primary key order as the server sorts it. The
+        matching row is found by the server (an index seek if the column is
+        indexed, see ensure_index) and its position comes from an in-memory list
+        of the table's primary keys, built on first use, kept in step with writes
+        made through this interface and rebuilt at least every
+        _ROW_ORDER_MAX_AGE seconds, so a lookup transfers one key rather than the
+        whole column. String values must match exactly (case and trailing spaces
+        included), as before, even where the column's collation is looser.
+
+        Returns:
+            int: The row's position, or -1 if there is no such row or an error occurs.
+        """
         if not self.cursor:
             print("Error: Not connected to database. Call .connect() first.")
             return -1
 
         sql_safe_tablename = f"`{tablename.strip('`')}`"
         sql_safe_column_name = f"`{column_name.strip('`')}`"
+        keyval = key_value.strip('`') if isinstance(key_value, str) else key_value
 
         
         # 1. Check if table exists
-        self.cursor.execute(f"SHOW TABLES LIKE '{tablename.strip('`')}';")
-        if not self.cursor.fetchone():
+        info = self._table_info(tablename)
+        if info is None:
             print(f"Error: Table '{tablename}' does not exist.")
             return -1
-        self.cursor.fetchall() # Clear cursor
 
         # 2. Check if column exists
-        self.cursor.execute(f"SHOW COLUMNS FROM {sql_safe_tablename} LIKE '{column_name.strip('`')}';")
-        if not self.cursor.fetchone():
+        if not self._column_name(tablename, column_name):
             print(f"Error: Column '{column_name}' does not exist in table '{tablename}'.")
             return -1
-        self.cursor.fetchall() # Clear cursor
-
-        # 3. Fetch all values from the specified column to find the index
-        # This query implicitly defines the order for indexing in this context.
-        # For strict ordering, an ORDER BY clause would be needed, but that
-        # would require knowing the column(s) to order by.
-        select_sql = f"SELECT {sql_safe_column_name} FROM {sql_safe_tablename};"
-        self.cursor.execute(select_sql)
-        
-        # fetchall returns a list of tuples, e.g., [('value1',), ('value2',)]
-        column_values_tuples = self.cursor.fetchall()
-        self.cursor.fetchall() # Clear cursor
 
-        # Convert list of tuples to a flat list of values
-        column_values = [item[0] for item in column_values_tuples]
-        
-        ret = -1
-        # Search for the key_value in the list
-        for i in range(len(column_values)):
-            str = column_values[i].strip('`')
-            keyval = key_value.strip('`')
-            if str == keyval:
-                ret = i
+        if len(info["primary_key"]) != 1:
+            # Without a single-column key there is no stable order to index, so
+            # fall back to scanning the column in the order the server returns it
+            self.cursor.execute(f"SELECT {sql_safe_column_name} FROM {sql_safe_tablename};")
+            for i, (value,) in enumerate(self.cursor.fetchall()):
+                if isinstance(value, str) and value.strip('`') == keyval:
+                    return i
+            return -1
+
+        sql_safe_pk_column = f"`{info['primary_key'][0]}`"
+
+        # 3. Let the server find the candidate rows; the first exact match wins
+        select_sql = (f"SELECT {sql_safe_pk_column}, {sql_safe_column_name} FROM {sql_safe_tablename} "
+                      f"WHERE {sql_safe_column_name} = %s ORDER BY {sql_safe_pk_column};")
+        self.cursor.execute(select_sql, (keyval,))
+        match = None
+        for key, value in self.cursor.fetchall():
+            if not isinstance(value, str) or value.strip('`') == keyval:
+                match = key
                 break
-        
-        return ret
+        if match is None:
+            return -1
+
+        # 4. Its position among the sorted keys. A key the index doesn't hold was
+        # written by another process since it was built, so rebuild it once
+        row_order = self._row_order_index(tablename)
+        if row_order is None:
+            return -1
+        position = row_order.position(match)
+        if position == -1:
+            self._row_orders.pop(tablename.strip('`'), None)
+            row_order = self._row_order_index(tablename)
+            position = row_order.position(match) if row_order is not None else -1
+        return position
+
+  # the table's _RowOrderIndex, built from its primary keys in server order unless a
+  # recent one is held. Called from get_row/find_row_index, on the connection they hold
+  def _row_order_index(self, tablename):
+        from mysql.connector import Error # Ensure Error is imported
+
+        tablename = tablename.strip('`')
+        row_order = self._row_orders.get(tablename)
+        # rebuilt once it may have missed writes made by other processes
+        if row_order is not None and time.monotonic() - row_order.built_at < _ROW_ORDER_MAX_AGE:
+            return row_order
+
+        primary_key_column = self._primary_key_column(tablename)
+        if primary_key_column is None:
+            print(f"Error: Could not determine primary key for table '{tablename}'.")
+            return None
+
+        try:
+            self.cursor.execute(f"SELECT `{primary_key_column}` FROM `{tablename}` ORDER BY `{primary_key_column}`;")
+            row_order = _RowOrderIndex(row[0] for row in self.cursor.fetchall())
+        except Error as e:
+            print(f"Error reading primary keys of table '{tablename}': {e}")
+            return None
+
+        self._row_orders[tablename] = row_order
+        return row_order
+
+  @_uses_connection
+  def ensure_index(self, tablename, column_name):
+        """
+        Creates an index on a column unless an index already starts with it, so
+        lookups by that column (e.g. find_row_index) are index seeks rather than
+        table scans. TEXT columns are indexed on their first 255 characters.
+
+        Returns:
+            bool: True if the column is indexed, False if an error occurred.
+        """
+        from mysql.connector import Error # Ensure Error is imported
+
+        if not self.cursor:
+            print("Error: Not connected to database. Call .connect() first.")
+            return False
+
+        column = self._column_name(tablename, column_name)
+        if column is None:
+            print(f"Error: Column '{column_name}' does not exist in table '{tablename}'.")
+            return False
+        tablename = tablename.strip('`')
+
+        try:
+            self.cursor.execute(
+                "SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s "
+                "AND COLUMN_NAME = %s AND SEQ_IN_INDEX = 1 LIMIT 1",
+                (self.database_name, tablename, column))
+            if self.cursor.fetchall():
+                return True
+
+            prefix = "(255)" if "TEXT" in self._table_info(tablename)["types"][column].upper() else ""
+            self.cursor.execute(f"CREATE INDEX `idx_{column}` ON `{tablename}` (`{column}`{prefix});")
+            print(f"Created index on '{tablename}.{column}'.")
+            return True
+        except Error as e:
+            print(f"Error creating index on '{tablename}.{column}': {e}")
+            return False
         
   # remove a row given index
+  @_uses_connection
   def delete_row_by_index(self, tablename, index):
         if not self.cursor:
             print("Error: Not connected to database. Call .connect() first.")
@@ -655,49 +1939,44 @@ class SQLInterface():
 
         try:
             # 1. Check if table exists
-            self.cursor.execute(f"SHOW TABLES LIKE '{tablename.strip('`')}';")
-            if not self.cursor.fetchone():
+            if not self._table_exists(tablename):
                 print(f"Error: Table '{tablename}' does not exist. Cannot delete row.")
                 return False
-            self.cursor.fetchall() # Clear cursor
 
             # 2. Get the primary key column name(s)
             # This assumes a single-column primary key. For composite keys, this logic needs expansion.
-            primary_key_column = None
-            self.cursor.execute(f"SHOW COLUMNS FROM {sql_safe_tablename} WHERE `Key` = 'PRI';")
-            pk_info = self.cursor.fetchone()
-            self.cursor.fetchall() # Clear cursor
-
-            if pk_info:
-                primary_key_column = pk_info[0] # The first element is the column name
-            else:
+            primary_key_column = self._primary_key_column(tablename)
+            if primary_key_column is None:
                 print(f"Error: Could not determine primary key for table '{tablename}'. Cannot delete by index.")
                 return False
 
             sql_safe_pk_column = f"`{primary_key_column.strip('`')}`"
 
-            # 3. Fetch all primary key values to determine the one at the given index
-            # Again, the order here is not guaranteed without ORDER BY.
-            self.cursor.execute(f"SELECT {sql_safe_pk_column} FROM {sql_safe_tablename};")
-            pk_values_tuples = self.cursor.fetchall()
+            # 3. Look up the primary key at the given index (rows are in primary key order).
+            # The cached row order may predate other processes' writes, so the server
+            # says which key is at 'index', locked for the rest of the transaction
+            self.cursor.execute(f"SELECT {sql_safe_pk_column} FROM {sql_safe_tablename} "
+                                f"ORDER BY {sql_safe_pk_column} LIMIT 1 OFFSET %s FOR UPDATE;", (index,))
+            found = self.cursor.fetchone()
             self.cursor.fetchall() # Clear cursor
-
-            if not pk_values_tuples:
-                print(f"No rows found in table '{tablename}'. Cannot delete by index {index}.")
-                return False
-
-            if index >= len(pk_values_tuples):
-                print(f"Error: Index {index} is out of bounds for table '{tablename}' (has {len(pk_values_tuples)} rows).")
+            if found is None:
+                self.db.rollback()
+                print(f"Error: Index {index} is out of bounds for table '{tablename}'.")
                 return False
+            pk_to_delete = found[0]
 
-            pk_to_delete = pk_values_tuples[index][0] # Get the PK value at the desired index
+            row_order = self._row_orders.get(tablename.strip('`'))
+            if row_order is not None and row_order.key_at(index) != pk_to_delete:
+                self._row_orders.pop(tablename.strip('`'), None) # stale; rebuilt on next use
 
             # 4. Delete the row using its primary key
             delete_sql = f"DELETE FROM {sql_safe_tablename} WHERE {sql_safe_pk_column} = %s;"
             self.cursor.execute(delete_sql, (pk_to_delete,))
+            deleted = self.cursor.rowcount # read before the write listeners reuse the cursor
             self.db.commit()
+            self._notify_write(tablename, (pk_to_delete, None), [({primary_key_column: pk_to_delete}, None)])
 
-            if self.cursor.rowcount > 0:
+            if deleted > 0:
                 print(f"Successfully deleted row at conceptual index {index} (Primary Key: '{pk_to_delete}') from table '{tablename}'.")
                 return True
             else:
@@ -718,9 +1997,30 @@ class SQLInterface():
             return False  
   
   # export a table as CSV
-  def export_table(self, tablename, output_filename):
+  @_uses_connection
+  def export_table(self, tablename, output_filename, columns=None, where=None, params=(),
+                   compression=None, chunk_size=10000):
         """
-        Reads all data from a specified MySQL table and exports it to a CSV file.
+        Reads data from a specified MySQL table and exports it to a CSV file.
+
+        Rows are streamed from an unbuffered cursor 'chunk_size' at a time and
+        written as they arrive, so memory use is bounded by the chunk size rather
+        than the table size. Canonical barcode columns are written as barcode text,
+        leading zeros included, so the file reads back to the same keys.
+
+        Args:
+            tablename (str): The table to export.
+            output_filename (str): The CSV file to write.
+            columns (list, optional): Columns to export, in order. Defaults to None (all).
+            where (str, optional): SQL condition selecting the rows, with %s placeholders
+                                   for 'params', e.g. "code LIKE %s". Defaults to None (all rows).
+            params (tuple, optional): Values for the placeholders in 'where'.
+            compression (str, optional): 'gzip' or 'zstd' (needs the 'zstandard' package).
+                                         Defaults to None, or inferred from a .gz/.zst extension.
+            chunk_size (int, optional): Rows fetched per round trip. Defaults to 10000.
+
+        Returns:
+            int: The number of rows exported, or None if an error occurs.
         """
         
         import csv
@@ -731,24 +2031,31 @@ class SQLInterface():
             print("Error: Not connected to database. Ensure .connect() was called successfully.")
             return
 
+        if compression is None:
+            if output_filename.endswith('.gz'):
+                compression = 'gzip'
+            elif output_filename.endswith('.zst'):
+                compression = 'zstd'
+
         try:
             # Check if the table exists before attempting to read
-            self.cursor.execute(f"SHOW TABLES LIKE '{tablename}';")
-            table_exists = self.cursor.fetchone()
-            if not table_exists:
+            if not self._table_exists(tablename):
                 print(f"Error: Table '{tablename}' does not exist in the database.")
                 return
 
-            # Select all data from the table
-            select_sql = f"SELECT * FROM `{tablename}`;"
-            self.cursor.execute(select_sql)
-
-            # Get column headers from cursor description
-            # cursor.description returns a tuple of (name, type_code, display_size, internal_size, precision, scale, null_ok)
-            column_headers = [i[0] for i in self.cursor.description]
+            columns_sql = "*"
+            if columns:
+                resolved = [self._column_name(tablename, col) for col in columns]
+                missing = [col for col, name in zip(columns, resolved) if name is None]
+                if missing:
+                    print(f"Error: Column(s) {missing} do not exist in table '{tablename}'.")
+                    return
+                columns_sql = ", ".join([f"`{name}`" for name in resolved])
 
-            # Fetch all rows from the query result
-            rows = self.cursor.fetchall()
+            # Select the data from the table
+            select_sql = f"SELECT {columns_sql} FROM `{tablename.strip('`')}`"
+            if where:
+                select_sql += f" WHERE {where}"
 
             # Ensure output directory exists
             output_dir = os.path.dirname(output_filename)
@@ -756,30 +2063,279 @@ class SQLInterface():
                 os.makedirs(output_dir)
                 print(f"Created directory: {output_dir}")
 
-            # Write data to CSV file
-            with open(output_filename, 'w', newline='', encoding='utf-8') as csvfile:
-                csv_writer = csv.writer(csvfile)
-                
-                # Write header row
-                csv_writer.writerow(column_headers)
-                
-                # Write data rows
-                csv_writer.writerows(rows)
+            rows_exported = 0
+            with self._dedicated_connection() as conn:
+                if conn is None:
+                    print("Error: Not connected to database. Ensure .connect() was called successfully.")
+                    return
+                cursor = conn.cursor(buffered=False)
+                try:
+                    cursor.execute(select_sql, tuple(params))
+
+                    # Get column headers from cursor description
+                    # cursor.description returns a tuple of (name, type_code, display_size, internal_size, precision, scale, null_ok)
+                    column_headers = [i[0] for i in cursor.description]
+                    # canonical barcodes are written as barcode text, as the API sends them
+                    barcode_names = set(self._barcode_output_columns(tablename, column_headers))
+                    barcode_indexes = [i for i, name in enumerate(column_headers) if name in barcode_names]
+
+                    # Write data to CSV file
+                    with _open_text_output(output_filename, compression) as csvfile:
+                        csv_writer = csv.writer(csvfile)
+                        
+                        # Write header row
+                        csv_writer.writerow(column_headers)
+                        
+                        # Write data rows as they are fetched
+                        while True:
+                            rows = cursor.fetchmany(chunk_size)
+                            if not rows:
+                                break
+                            if barcode_indexes:
+                                rows = [list(row) for row in rows]
+                                for row in rows:
+                                    for i in barcode_indexes:
+                                        if row[i] is not None:
+                                            row[i] = gtin_text(row[i])
+                            csv_writer.writerows(rows)
+                            rows_exported += len(rows)
+                finally:
+                    try:
+                        if conn.unread_result:
+                            conn.consume_results()
+                        cursor.close()
+                    except Error:
+                        pass
 
-            print(f"Successfully exported data from table '{tablename}' to '{output_filename}'.")
+            print(f"Successfully exported {rows_exported} rows from table '{tablename}' to '{output_filename}'.")
+            return rows_exported
 
         except Error as e:
             print(f"Error exporting data from table '{tablename}': {e}")
         except Exception as e:
             print(f"An unexpected error occurred during CSV export: {e}")    
 
-  def get_table_as_json_payload(self, tablename):
+  @_uses_connection
+  def export_snapshot(self, tablename, output_filename, row_group_size=65536):
+        """
+        Dumps a table to a columnar binary snapshot (see snapshot.py) that
+        import_snapshot loads back. The table definition travels with the data.
+        Rows are streamed from the server one row group at a time.
+
+        Args:
+            tablename (str): The table to dump.
+            output_filename (str): The snapshot file to write.
+            row_group_size (int, optional): Rows per row group. Defaults to 65536.
+
+        Returns:
+            int: The number of rows written, or None if an error occurs.
+        """
+        from mysql.connector import Error # Ensure Error is imported
+        from snapshot import SnapshotWriter
+
+        if not self.cursor:
+            print("Error: Not connected to database. Call .connect() first.")
+            return None
+
+        info = self._table_info(tablename)
+        if info is None:
+            print(f"Error: Table '{tablename}' does not exist in the database.")
+            return None
+        tablename = tablename.strip('`')
+        columns = [(name, info["types"][name]) for name in info["columns"]]
+        columns_sql = ", ".join([f"`{name}`" for name in info["columns"]])
+
+        try:
+            with self._dedicated_connection() as conn:
+                if conn is None:
+                    print("Error: Not connected to database. Call .connect() first.")
+                    return None
+                cursor = conn.cursor(buffered=False)
+                try:
+                    cursor.execute(f"SELECT {columns_sql} FROM `{tablename}`")
+                    with SnapshotWriter(output_filename, tablename, columns, info["primary_key"]) as writer:
+                        while True:
+                            rows = cursor.fetchmany(row_group_size)
+                            if not rows:
+                                break
+                            writer.write_row_group(rows)
+                            print(f"  ... Wrote {writer.footer['rows']} rows...")
+                        rows_written = writer.footer["rows"]
+                finally:
+                    try:
+                        if conn.unread_result:
+                            conn.consume_results()
+                        cursor.close()
+                    except Error:
+                        pass
+
+            print(f"Successfully wrote {rows_written} rows from table '{tablename}' to snapshot '{output_filename}'.")
+            return rows_written
+
+        except Error as e:
+            print(f"Error writing snapshot of table '{tablename}': {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred while writing the snapshot: {e}")
+        return None
+
+  @_uses_connection
+  def import_snapshot(self, filename, tablename=None, batch_size=10000):
+        """
+        Loads a snapshot written by export_snapshot, creating the table from the
+        definition stored in it if needed. Rows whose key already exists are skipped.
+
+        The snapshot's values load back as the types they were dumped as (numbers,
+        text, bytes) and are inserted in INSERT IGNORE batches.
+
+        Args:
+            filename (str): The snapshot file.
+            tablename (str, optional): Table to load into. Defaults to None (the
+                                       table the snapshot was taken from).
+            batch_size (int, optional): Rows per INSERT batch. Defaults to 10000.
+
+        Returns:
+            dict: {'rows_loaded': ..., 'rows_skipped': ...}, or None if an error occurs.
         """
-        Retrieves all data from a table and formats it into the 
+        from mysql.connector import Error # Ensure Error is imported
+        from snapshot import SnapshotReader
+
+        if not self.cursor:
+            print("Error: Not connected to database. Call .connect() first.")
+            return None
+
+        try:
+            reader = SnapshotReader(filename)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not open snapshot '{filename}': {e}")
+            return None
+
+        try:
+            tablename = (tablename or reader.table).strip('`')
+            column_names = [name for name, _ in reader.columns]
+
+            if not self._table_exists(tablename):
+                col_definitions = [f"`{name}` {col_type}" for name, col_type in reader.columns]
+                if reader.primary_key:
+                    col_definitions.append("PRIMARY KEY (" + ", ".join([f"`{name}`" for name in reader.primary_key]) + ")")
+                print(f"Table '{tablename}' not found. Creating it...")
+                self.new_table(f"`{tablename}`", ", ".join(col_definitions))
+
+            print(f"Loading {reader.row_count} rows from snapshot '{filename}' into table '{tablename}'...")
+            col_names = ', '.join([f"`{name}`" for name in column_names])
+            placeholders = ', '.join(['%s'] * len(column_names))
+            insert_sql = f"INSERT IGNORE INTO `{tablename}` ({col_names}) VALUES ({placeholders})"
+            rows_loaded = 0
+            for group in reader.iter_row_groups():
+                for i in range(0, len(group), batch_size):
+                    rows_loaded += self._insert_batch(insert_sql, group[i:i + batch_size])
+
+            self._notify_write(tablename)
+            rows_skipped = reader.row_count - rows_loaded
+            print(f"Successfully loaded snapshot '{filename}' into table '{tablename}'.")
+            print(f"Rows loaded: {rows_loaded}, rows skipped: {rows_skipped} (duplicates)")
+            return {"rows_loaded": rows_loaded, "rows_skipped": rows_skipped}
+
+        except Error as e:
+            print(f"A database error occurred while loading snapshot '{filename}': {e}")
+            self.db.rollback()
+            return None
+        finally:
+            reader.close()
+
+  @_uses_connection
+  def export_barcode_index(self, output_filename, tablename="eanref", key_col="code",
+                           value_col="product_name", chunk_size=10000):
+        """
+        Builds a memory-mapped lookup file (see barcode_index.py) of key_col -> value_col
+        from a table, by default the eanref barcode reference. Servers can answer
+        reference lookups from it without a database round trip.
+
+        Args:
+            output_filename (str): The index file to write. Replaced atomically.
+            tablename (str, optional): The table to index. Defaults to "eanref".
+            key_col (str, optional): The lookup key column. Defaults to "code".
+            value_col (str, optional): The column returned by lookups. Defaults to "product_name".
+            chunk_size (int, optional): Rows fetched per round trip. Defaults to 10000.
+
+        Returns:
+            int: The number of keys indexed, or None if an error occurs.
+        """
+        from mysql.connector import Error # Ensure Error is imported
+        from barcode_index import write_index
+
+        if not self.cursor:
+            print("Error: Not connected to database. Call .connect() first.")
+            return None
+
+        if not self._table_exists(tablename):
+            print(f"Error: Table '{tablename}' does not exist in the database.")
+            return None
+        key_name = self._column_name(tablename, key_col)
+        value_name = self._column_name(tablename, value_col)
+        if key_name is None or value_name is None:
+            print(f"Error: Column '{key_col}' or '{value_col}' does not exist in table '{tablename}'.")
+            return None
+        sql_safe_tablename = f"`{tablename.strip('`')}`"
+
+        try:
+            self.cursor.execute(f"SELECT MAX(LENGTH(`{key_name}`)) FROM {sql_safe_tablename}")
+            key_width = self.cursor.fetchone()[0] or 0
+
+            with self._dedicated_connection() as conn:
+                if conn is None:
+                    print("Error: Not connected to database. Call .connect() first.")
+                    return None
+                cursor = conn.cursor(buffered=False)
+                try:
+                    # byte order, which is the order the index is searched in
+                    cursor.execute(f"SELECT `{key_name}`, `{value_name}` FROM {sql_safe_tablename} "
+                                   f"ORDER BY BINARY `{key_name}`")
+
+                    def rows():
+                        while True:
+                            chunk = cursor.fetchmany(chunk_size)
+                            if not chunk:
+                                return
+                            yield from chunk
+
+                    indexed = write_index(output_filename, rows(), int(key_width))
+                finally:
+                    try:
+                        if conn.unread_result:
+                            conn.consume_results()
+                        cursor.close()
+                    except Error:
+                        pass
+
+            print(f"Indexed {indexed} keys from table '{tablename}' into '{output_filename}'.")
+            return indexed
+
+        except Error as e:
+            print(f"Error indexing table '{tablename}': {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred while building the index: {e}")
+        return None
+
+  @_uses_connection
+  def get_table_as_json_payload(self, tablename, limit=None, after=None, where=None):
+        """
+        Retrieves data from a table and formats it into the 
         {"payload": [ ... ]} JSON structure.
 
+        With 'limit' the rows are paged by primary key (keyset pagination): each
+        page holds up to 'limit' rows whose key is greater than 'after', and
+        "next" holds the key to pass as 'after' for the following page (None on
+        the last one). Each page costs one index range read, however deep it is.
+
         Args:
             tablename (str): The name of the table to read from.
+            limit (int, optional): Maximum rows to return. Defaults to None (all rows).
+            after (optional): Primary key value to start after. Defaults to None
+                              (start from the first row).
+            where (dict, optional): Column = value conditions selecting the rows, e.g.
+                                    {"StoreID": "3"} for one store's slice of a shared
+                                    table. Those columns are left out of the rows, and
+                                    pages are keyed on the next primary key column.
 
         Returns:
             dict: A Python dictionary formatted as requested,
@@ -800,13 +2356,42 @@ class SQLInterface():
             # get_column_names() will have already printed an error
             print(f"Aborting: Could not get column names for table '{tablename}'.")
             return None
+        column_names = _unfiltered_columns(column_names, where)
 
-        # --- Step 2: Fetch All Rows ---
+        # --- Step 2: Fetch the Rows ---
         sql_safe_tablename = f"`{tablename.strip('`')}`"
-        query_sql = f"SELECT * FROM {sql_safe_tablename};"
+        columns_sql = ", ".join([f"`{name}`" for name in column_names])
+        filter_sql, params = _where_sql(where)
+        conditions = [filter_sql[len(" AND "):]] if filter_sql else []
+        query_sql = f"SELECT {columns_sql} FROM {sql_safe_tablename}"
+
+        if limit is not None or after is not None:
+            if limit is not None and (not isinstance(limit, int) or limit <= 0):
+                print("Error: 'limit' must be a positive integer.")
+                return None
+            primary_key_column = self._keyset_column(tablename, where)
+            if primary_key_column is None:
+                print(f"Error: Could not determine primary key for table '{tablename}'. Cannot paginate.")
+                return None
+            sql_safe_pk_column = f"`{primary_key_column}`"
+            if after is not None:
+                after = self.barcode_key(tablename, primary_key_column, after) # "next" is sent as barcode text
+                if after is None:
+                    print("Error: 'after' is not a valid barcode.")
+                    return None
+                conditions.append(f"{sql_safe_pk_column} > %s")
+                params += (after,)
+            if conditions:
+                query_sql += " WHERE " + " AND ".join(conditions)
+            query_sql += f" ORDER BY {sql_safe_pk_column}"
+            if limit is not None:
+                query_sql += " LIMIT %s"
+                params += (limit,)
+        elif conditions:
+            query_sql += " WHERE " + " AND ".join(conditions)
 
         try:
-            self.cursor.execute(query_sql)
+            self.cursor.execute(query_sql, params)
             
             # Fetch all rows from the query result
             all_rows = self.cursor.fetchall()
@@ -821,16 +2406,24 @@ class SQLInterface():
             # with the row's tuple of values.
             
             payload_list = [dict(zip(column_names, row)) for row in all_rows]
+            for name in self._barcode_output_columns(tablename, column_names):
+                for row in payload_list:
+                    if row[name] is not None:
+                        row[name] = gtin_text(row[name])
 
             # --- Step 4: Wrap in the final "payload" dictionary ---
             final_output = {
                 "payload": payload_list
             }
+
+            if limit is not None:
+                # a short page means there is nothing after it
+                final_output["next"] = payload_list[-1][primary_key_column] if len(payload_list) == limit else None
             
             return final_output
 
         except Error as e:
-            print(f"Error fetching all rows from table '{tablename}': {e}")
+            print(f"Error fetching rows from table '{tablename}': {e}")
             try: self.cursor.fetchall() # Try to clear cursor on error
             except: pass
             return None
@@ -840,15 +2433,150 @@ class SQLInterface():
             except: pass
             return None
 
-  def import_dir(self, directory_path):
+  def iter_table_rows(self, tablename, chunk_size=1000, after=None, where=None):
+        """
+        Generator yielding every row of a table as a dict, in primary key order
+        (from 'after', if given). Rows are streamed off an unbuffered cursor
+        'chunk_size' at a time, so memory stays flat however large the table is.
+
+        The generator holds its own connection until exhausted or closed. Without a
+        pool that is the shared connection, so finish iterating before making
+        other calls.
+
+        Args:
+            tablename (str): The name of the table to read from.
+            chunk_size (int, optional): Rows fetched per round of fetchmany(). Defaults to 1000.
+            after (optional): Primary key value to start after. Defaults to None.
+            where (dict, optional): Column = value conditions selecting the rows, as
+                                    for get_table_as_json_payload. Defaults to None.
+
+        Raises:
+            ValueError: If 'after' is not a valid barcode for a barcode key column.
+            mysql.connector.Error: If the read fails, including part-way through, so
+                                   a cut-off stream can't pass for a complete one.
+        """
+        from mysql.connector import Error # Ensure Error is imported
+
+        column_names = self.get_column_names(tablename)
+        if not column_names:
+            print(f"Aborting: Could not get column names for table '{tablename}'.")
+            return
+        column_names = _unfiltered_columns(column_names, where)
+
+        primary_key_column = self._keyset_column(tablename, where)
+        barcode_names = self._barcode_output_columns(tablename, column_names)
+        sql_safe_tablename = f"`{tablename.strip('`')}`"
+        columns_sql = ", ".join([f"`{name}`" for name in column_names])
+        filter_sql, params = _where_sql(where)
+        conditions = [filter_sql[len(" AND "):]] if filter_sql else []
+        if primary_key_column is not None and after is not None:
+            after = self.barcode_key(tablename, primary_key_column, after)
+            if after is None:
+                raise ValueError("'after' is not a valid barcode")
+            conditions.append(f"`{primary_key_column}` > %s")
+            params += (after,)
+        query_sql = f"SELECT {columns_sql} FROM {sql_safe_tablename}"
+        if conditions:
+            query_sql += " WHERE " + " AND ".join(conditions)
+        if primary_key_column is not None:
+            query_sql += f" ORDER BY `{primary_key_column}`"
+
+        with self._dedicated_connection() as conn:
+            if conn is None:
+                print("Error: Not connected to database. Call .connect() first.")
+                return
+            cursor = conn.cursor(buffered=False)
+            # the rows are read while the caller consumes them, so the time spent
+            # waiting on the server is recorded chunk by chunk (as _uses_connection would)
+            db_seconds = 0.0
+            try:
+                started = time.perf_counter()
+                cursor.execute(query_sql, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    elapsed = time.perf_counter() - started
+                    db_seconds += elapsed
+                    metrics.add_db_time(elapsed)
+                    if not rows:
+                        break
+                    for row in rows:
+                        row = dict(zip(column_names, row))
+                        for name in barcode_names:
+                            if row[name] is not None:
+                                row[name] = gtin_text(row[name])
+                        yield row
+                    started = time.perf_counter()
+            except Error as e:
+                print(f"Error streaming rows from table '{tablename}': {e}")
+                raise
+            finally:
+                _DB_CALL_SECONDS.observe(db_seconds, "iter_table_rows")
+                # a consumer that stops early leaves the rest of the result on the wire
+                try:
+                    if conn.unread_result:
+                        conn.consume_results()
+                    cursor.close()
+                except Error:
+                    pass
+
+  # a connection not bound to the calling thread, for long-lived streaming reads
+  @contextmanager
+  def _dedicated_connection(self):
+    if self.pool is None:
+      yield self.db
+      return
+
+    conn = self._checkout()
+    if conn is None:
+      yield None
+      return
+    try:
+      yield conn
+    finally:
+      with self._pool_lock:
+        self._pool_in_use -= 1
+      self._release(conn, None)
+
+  # name of the table's (first) primary key column, or None
+  def _primary_key_column(self, tablename):
+    info = self._table_info(tablename)
+    if info is None or not info["primary_key"]:
+      return None
+    return info["primary_key"][0]
+
+  # the primary key column rows are ordered and paged on once 'where' has fixed
+  # the leading ones, e.g. Barcode for one StoreID of a (StoreID, Barcode) key
+  def _keyset_column(self, tablename, where=None):
+    info = self._table_info(tablename)
+    if info is None:
+      return None
+    fixed = {col.strip('`').lower() for col in (where or ())}
+    for col in info["primary_key"]:
+      if col.lower() not in fixed:
+        return col
+    return None
+
+  @_uses_connection
+  def import_dir(self, directory_path, workers=1):
         """
         Scans a directory for CSV files, and imports them into MySQL tables.
         If a table corresponding to a CSV file already exists, it will be skipped.
 
+        With workers > 1, up to that many files are imported at once, each over
+        its own connection.
+
         Args:
             directory_path (str): The path to the directory containing CSV files.
+            workers (int, optional): Files imported concurrently. Defaults to 1.
+
+        Returns:
+            dict: Summary counts ('found', 'imported', 'skipped', 'failed', 'rows'),
+                  or None if the directory could not be processed.
         """
         import os # Import os module for directory operations
+        import queue
+        import time
+        from concurrent.futures import ThreadPoolExecutor
         
         if not self.cursor:
             print("Error: Not connected to database. Ensure .connect() was called successfully.")
@@ -868,8 +2596,8 @@ class SQLInterface():
             print(f"Existing tables in database: {', '.join(existing_tables) if existing_tables else 'None'}")
 
             files_found = 0
-            files_imported = 0
             files_skipped = 0
+            to_import = []
 
             for filename in os.listdir(directory_path):
                 if filename.lower().endswith('.csv'):
@@ -878,8 +2606,6 @@ class SQLInterface():
                     
                     # Derive table name from CSV filename (e.g., "my_data.csv" -> "my_data")
                     base_table_name = os.path.splitext(filename)[0]
-
-                    sql_table_name = f"`{base_table_name}`"
                     
                     # Check if a table with this (unquoted) name already exists in the database's list
                     # Note: existing_tables contains unquoted names from SHOW TABLES
@@ -887,12 +2613,54 @@ class SQLInterface():
                         print(f"  Skipping '{filename}': Table '{base_table_name}' already exists.")
                         files_skipped += 1
                     else:
-                        print(f"  Found new CSV: '{filename}'. Importing into table '{base_table_name}'...")
-                        # Call the existing import_csv function, passing the backticked table name
-                        self.import_csv(full_file_path, sql_table_name)
-                        files_imported += 1
-                        # After successful import, add the unquoted name to existing_tables set
-                        existing_tables.add(base_table_name) 
+                        to_import.append((filename, full_file_path, base_table_name))
+                        # Claim the name so a second file with the same base name is skipped
+                        existing_tables.add(base_table_name)
+
+            started = time.monotonic()
+            results = [] # (filename, counts or None)
+
+            def import_one(interface, filename, full_file_path, base_table_name):
+                print(f"  Found new CSV: '{filename}'. Importing into table '{base_table_name}'...")
+                file_started = time.monotonic()
+                # Call the existing import_csv function, passing the backticked table name
+                counts = interface.import_csv(full_file_path, f"`{base_table_name}`")
+                if counts is None:
+                    print(f"  Failed to import '{filename}'.")
+                else:
+                    print(f"  Imported '{filename}': {counts['rows_imported']} rows in {time.monotonic() - file_started:.1f}s "
+                          f"({len(results) + 1}/{len(to_import)} files done)")
+                results.append((filename, counts))
+
+            if workers > 1 and len(to_import) > 1:
+                workers = min(workers, len(to_import))
+                # each running import borrows an interface, i.e. its own connection
+                interfaces = queue.Queue()
+                worker_interfaces = self._worker_interfaces(workers)
+                for interface in worker_interfaces:
+                    interfaces.put(interface)
+
+                def run(args):
+                    interface = interfaces.get()
+                    try:
+                        import_one(interface, *args)
+                    finally:
+                        interfaces.put(interface)
+
+                try:
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        list(executor.map(run, to_import))
+                finally:
+                    for interface in worker_interfaces:
+                        if interface is not self:
+                            interface.close()
+            else:
+                for args in to_import:
+                    import_one(self, *args)
+
+            files_imported = sum(1 for _, counts in results if counts is not None)
+            files_failed = len(results) - files_imported
+            total_rows = sum(counts['rows_imported'] for _, counts in results if counts is not None)
 
             if files_found == 0:
                 print("No CSV files found in the specified directory.")
@@ -901,67 +2669,59 @@ class SQLInterface():
                 print(f"  Total CSV files found: {files_found}")
                 print(f"  New files imported: {files_imported}")
                 print(f"  Files skipped (table already exists): {files_skipped}")
+                print(f"  Files that failed to import: {files_failed}")
+                print(f"  Rows imported: {total_rows} in {time.monotonic() - started:.1f}s")
+
+            return {"found": files_found, "imported": files_imported, "skipped": files_skipped,
+                    "failed": files_failed, "rows": total_rows}
 
         except Exception as e:
             print(f"An error occurred while processing directory '{directory_path}': {e}")
 
+  @_uses_connection
   def get_column_names(self, tablename):
-        from mysql.connector import Error # Ensure Error is imported for specific exception handling
-
         if not self.cursor:
             print("Error: Not connected to database. Call .connect() first.")
             return []
 
-        # Ensure the table name is properly backticked for the SQL query
-        sql_safe_table_name = f"`{tablename.strip('`')}`"
-
-        try:
-            # Check if the table exists first
-            self.cursor.execute(f"SHOW TABLES LIKE '{tablename.strip('`')}';")
-            table_exists = self.cursor.fetchone()
-            if not table_exists:
-                print(f"Error: Table '{tablename}' does not exist in the database.")
-                return []
-
-            # Execute a query to get the table's structure/description
-            # SELECT * LIMIT 0 is a common way to get column metadata without fetching data
-            self.cursor.execute(f"SELECT * FROM {sql_safe_table_name} LIMIT 0;")
-            
-            # The cursor.description attribute holds metadata about the columns
-            # It's a list of tuples, where the first element of each tuple is the column name
-            if self.cursor.description:
-                column_names = [column[0] for column in self.cursor.description]
-                self.cursor.fetchall()
-                return column_names
-            else:
-                print(f"No column information found for table '{tablename}'. It might be empty or malformed.")
-                self.cursor.fetchall()
-                return []
-
-        except Error as e:
-            print(f"Error getting column names for table '{tablename}': {e}")
-            return []
-        except Exception as e:
-            print(f"An unexpected error occurred while getting column names: {e}")
+        # Served from the schema metadata cache, in table order
+        info = self._table_info(tablename)
+        if info is None:
+            print(f"Error: Table '{tablename}' does not exist in the database.")
             return []
+        return list(info["columns"])
   
-  def query(self, tablename, col, key_col, key):
+  @_uses_connection
+  def query(self, tablename, col, key_col, key, where=None):
+        # 'where' optionally narrows the lookup with more column = value pairs, e.g. {"StoreID": "3"}
         from mysql.connector import Error # Ensure Error is imported
 
         if not self.cursor:
-            print("Error: Not connected to database. Call .connect() first.")
+            logger.error("Not connected to database. Call .connect() first.")
             return None
 
         # Sanitize table name
         sql_safe_tablename = f"`{tablename.strip('`')}`"
         
+        # barcode columns are looked up by their canonical key; an invalid code can't match
+        key = self.barcode_key(tablename, key_col, key)
+        where = self._barcode_where(tablename, where)
+        if key is None or where is None:
+            return None
+
         # Prepare the query with placeholders
         # We assume the columns are named 'code' and 'product_name'
-        query_sql = f"SELECT {col} FROM {sql_safe_tablename} WHERE {key_col} = %s"
+        where_sql, where_params = _where_sql(where)
+        query_sql = f"SELECT {col} FROM {sql_safe_tablename} WHERE {key_col} = %s{where_sql}"
 
         try:
+            if self.prepared_statements:
+                rows = self._run_prepared(query_sql, (key,) + where_params)
+                if rows is not None:
+                    return rows[0][0] if rows else None
+
             # Execute the query
-            self.cursor.execute(query_sql, (key,))
+            self.cursor.execute(query_sql, (key,) + where_params)
             
             # Fetch one result
             result = self.cursor.fetchone()
@@ -976,16 +2736,508 @@ class SQLInterface():
                 return None
 
         except Error as e:
-            print(f"Database error while querying table '{tablename}': {e}")
+            logger.error("Database error while querying table '%s': %s", tablename, e)
             try: self.cursor.fetchall() # Try to clear cursor on error
             except: pass
             return None
         except Exception as e:
-            print(f"An unexpected error occurred during query: {e}")
+            logger.error("An unexpected error occurred during query: %s", e)
             try: self.cursor.fetchall()
             except: pass
             return None
         
+  @_uses_connection
+  def query_many(self, tablename, col, key_col, keys, where=None, batch_size=1000):
+        """
+        Looks up many keys with 'WHERE key_col IN (...)' queries of up to
+        'batch_size' keys each, so a basket costs one round trip per batch
+        rather than one per key.
+
+        Args:
+            tablename (str): The table to query.
+            col (str): The column whose value is returned for each key.
+            key_col (str): The column the keys are matched against.
+            keys (iterable): The key values to look up. Duplicates are sent once.
+            where (dict, optional): Extra column = value conditions. Defaults to None.
+            batch_size (int, optional): Keys per query. Defaults to 1000.
+
+        Returns:
+            dict: Maps each key that was found, as given, to its 'col' value (keys with
+                  no row are absent), or None if an error occurs.
+        """
+        from mysql.connector import Error # Ensure Error is imported
+
+        if not self.cursor:
+            logger.error("Not connected to database. Call .connect() first.")
+            return None
+
+        # each key as looked up: its canonical form in a barcode column (None if invalid)
+        lookup_keys = {key: self.barcode_key(tablename, key_col, key) for key in dict.fromkeys(keys)}
+        keys = list(dict.fromkeys(key for key in lookup_keys.values() if key is not None))
+        where = self._barcode_where(tablename, where)
+        if not keys or where is None:
+            return {}
+
+        sql_safe_tablename = f"`{tablename.strip('`')}`"
+        where_sql, where_params = _where_sql(where)
+
+        try:
+            found = {}
+            for i in range(0, len(keys), batch_size):
+                batch = keys[i:i + batch_size]
+                rows = None
+                if self.prepared_statements:
+                    # padded to a power of two with repeats of the last key, so a
+                    # handful of statements serve every basket size
+                    size = 1 << (len(batch) - 1).bit_length()
+                    batch = batch + [batch[-1]] * (size - len(batch))
+                placeholders = ", ".join(["%s"] * len(batch))
+                query_sql = f"SELECT {key_col}, {col} FROM {sql_safe_tablename} WHERE {key_col} IN ({placeholders}){where_sql}"
+                if self.prepared_statements:
+                    rows = self._run_prepared(query_sql, tuple(batch) + where_params)
+                if rows is None:
+                    self.cursor.execute(query_sql, tuple(batch) + where_params)
+                    rows = self.cursor.fetchall()
+                found.update((row[0], row[1]) for row in rows)
+            return {key: found[lookup_key] for key, lookup_key in lookup_keys.items() if lookup_key in found}
+
+        except Error as e:
+            logger.error("Database error while querying table '%s': %s", tablename, e)
+            try: self.cursor.fetchall() # Try to clear cursor on error
+            except: pass
+            return None
+        except Exception as e:
+            logger.error("An unexpected error occurred during query: %s", e)
+            try: self.cursor.fetchall()
+            except: pass
+            return None
+
+  @_uses_connection
+  def query_tables(self, tablenames, col, key_col, key):
+        """
+        Looks one key up in several tables with the same layout (e.g. the store
+        tables) in a single UNION ALL query, instead of one query per table.
+        Tables that don't exist are skipped.
+
+        Args:
+            tablenames (list): The tables to search.
+            col (str): The column whose value is returned.
+            key_col (str): The column the key is matched against.
+            key: The key value.
+
+        Returns:
+            dict: Maps each table holding the key to its 'col' value, or None if an error occurs.
+        """
+        from mysql.connector import Error # Ensure Error is imported
+
+        if not self.cursor:
+            logger.error("Not connected to database. Call .connect() first.")
+            return None
+
+        # each table's lookup key (canonical in barcode columns); tables it can't match are skipped
+        table_keys = {}
+        for name in tablenames:
+            if self._table_exists(name):
+                table_key = self.barcode_key(name, key_col, key)
+                if table_key is not None:
+                    table_keys[name.strip('`')] = table_key
+        tablenames = list(table_keys)
+        if not tablenames:
+            return {}
+
+        query_sql = " UNION ALL ".join(
+            [f"SELECT %s, {col} FROM `{name}` WHERE {key_col} = %s" for name in tablenames])
+        params = []
+        for name in tablenames:
+            params += [name, table_keys[name]]
+
+        try:
+            self.cursor.execute(query_sql, tuple(params))
+            return {_as_str(row[0]): row[1] for row in self.cursor.fetchall()}
+
+        except Error as e:
+            logger.error("Database error while querying tables %s: %s", tablenames, e)
+            try: self.cursor.fetchall() # Try to clear cursor on error
+            except: pass
+            return None
+        except Exception as e:
+            logger.error("An unexpected error occurred during query: %s", e)
+            try: self.cursor.fetchall()
+            except: pass
+            return None
+
+  @_uses_connection
+  def query_all(self, tablename, col, key_col, where=None):
+        """
+        Reads a whole table as a key -> value mapping, the bulk counterpart of
+        query_many. Used to hold small tables (the store approval lists) in memory.
+
+        Args:
+            tablename (str): The table to read.
+            col (str): The column whose value is returned for each key.
+            key_col (str): The column the mapping is keyed on.
+            where (dict, optional): Column = value conditions selecting the rows,
+                                    e.g. {"StoreID": "3"}. Defaults to None (all rows).
+
+        Returns:
+            dict: Maps every key_col value to its 'col' value, or None if an error occurs.
+        """
+        from mysql.connector import Error # Ensure Error is imported
+
+        if not self.cursor:
+            logger.error("Not connected to database. Call .connect() first.")
+            return None
+
+        where = self._barcode_where(tablename, where)
+        if where is None:
+            return {}
+
+        sql_safe_tablename = f"`{tablename.strip('`')}`"
+        where_sql, where_params = _where_sql(where)
+        query_sql = f"SELECT {key_col}, {col} FROM {sql_safe_tablename}"
+        if where_sql:
+            query_sql += " WHERE" + where_sql[len(" AND"):]
+
+        try:
+            if self.prepared_statements:
+                rows = self._run_prepared(query_sql, where_params)
+                if rows is not None:
+                    return {row[0]: row[1] for row in rows}
+
+            self.cursor.execute(query_sql, where_params)
+            return {row[0]: row[1] for row in self.cursor.fetchall()}
+
+        except Error as e:
+            logger.error("Database error while querying table '%s': %s", tablename, e)
+            try: self.cursor.fetchall() # Try to clear cursor on error
+            except: pass
+            return None
+        except Exception as e:
+            logger.error("An unexpected error occurred during query: %s", e)
+            try: self.cursor.fetchall()
+            except: pass
+            return None
+
+# rows a bulk write passes to the write listeners; past this they're told the whole table changed
+_NOTIFY_ROWS_MAX = 1000
+
+# seconds a row order index is trusted before it is rebuilt, bounding how long rows
+# written by other processes can be missing from get_row / find_row_index positions
+_ROW_ORDER_MAX_AGE = 30
+
+# prepared statements kept open per connection before the least recently used is closed
+_PREPARED_PER_CONNECTION = 64
+# server sessions whose statements are remembered; more than a pool ever holds at
+# once, so only sessions left behind by reconnects are forgotten
+_PREPARED_SESSIONS = 64
+
+# seconds a table found missing is reported missing without asking the server again;
+# tables created through this interface are known at once
+_MISSING_TABLE_TTL = 5
+
+# MySQL's "This command is not supported in the prepared statement protocol yet"
+_ER_UNSUPPORTED_PS = 1295
+
+# " AND `col` = %s ..." and its parameters for an equality filter dict (empty for None)
+def _where_sql(where):
+  if not where:
+    return "", ()
+  return "".join([f" AND `{col.strip('`')}` = %s" for col in where]), tuple(where.values())
+
+# the columns left once those fixed by a 'where' filter are dropped
+def _unfiltered_columns(column_names, where):
+  if not where:
+    return column_names
+  fixed = {col.strip('`').lower() for col in where}
+  return [name for name in column_names if name.lower() not in fixed]
+
+class _RowOrderIndex():
+  """
+  A table's primary keys in the order the server sorts them (ORDER BY key, so
+  its collation decides): the key at a position is a list index and a key's
+  position a dict lookup. Integer keys sort the same in Python, so single
+  inserts and deletes are patched in place; for other key types add/remove
+  raise ValueError and the index is rebuilt instead. Thread-safe.
+  """
+  def __init__(self, keys):
+    self.keys = list(keys)
+    self.positions = {key: i for i, key in enumerate(self.keys)}
+    self.numeric = all(isinstance(key, int) for key in self.keys)
+    self.built_at = time.monotonic()
+    self.lock = threading.Lock()
+
+  def __len__(self):
+    return len(self.keys)
+
+  def position(self, key):
+    with self.lock:
+      if self.positions is None:
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+      return self.positions.get(key, -1)
+
+  def key_at(self, index):
+    with self.lock:
+      return self.keys[index] if 0 <= index < len(self.keys) else None
+
+  def add(self, key):
+    if not (self.numeric and isinstance(key, int)):
+      raise ValueError("keys not ordered like the server's")
+    with self.lock:
+      i = bisect.bisect_left(self.keys, key)
+      if i == len(self.keys) or self.keys[i] != key:
+        self.keys.insert(i, key)
+        self.positions = None # shifted; rebuilt on next position()
+
+  def remove(self, key):
+    if not (self.numeric and isinstance(key, int)):
+      raise ValueError("keys not ordered like the server's")
+    with self.lock:
+      i = bisect.bisect_left(self.keys, key)
+      if i < len(self.keys) and self.keys[i] == key:
+        del self.keys[i]
+        self.positions = None
+
+# open a text file for writing, optionally through a gzip or zstd compressor
+def _open_text_output(filename, compression=None):
+  import io
+  if compression is None:
+    return open(filename, 'w', newline='', encoding='utf-8')
+  if compression == 'gzip':
+    import gzip
+    return gzip.open(filename, 'wt', newline='', encoding='utf-8')
+  if compression == 'zstd':
+    try:
+      import zstandard
+    except ImportError:
+      raise ValueError("zstd compression needs the 'zstandard' package (pip install zstandard)")
+    raw = open(filename, 'wb')
+    return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw), newline='', encoding='utf-8')
+  raise ValueError(f"Unknown compression '{compression}' (expected 'gzip' or 'zstd')")
+
+# the value a row dict holds for a column (matched case-insensitively, like MySQL), or None
+def _value_for_column(data, column_name):
+  if column_name is None:
+    return None
+  for key, value in data.items():
+    if key.strip().strip('`').lower() == column_name.lower():
+      return value
+  return None
+
+# LOAD DATA's default escaping, applied to field text written for it
+_LOAD_DATA_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+# byte limits of the MySQL TEXT types
+_TEXT_TYPE_LIMITS = {'TINYTEXT': 255, 'TEXT': 65535, 'MEDIUMTEXT': 16777215}
+
+# turn a list of MySQL column types into (kind, limit) truncation rules, so the
+# type strings are parsed once per import instead of once per field. Columns
+# flagged in 'barcode_flags' get a ('gtin', None) canonicalization rule instead.
+def _compile_truncation_rules(column_types, barcode_flags=None):
+  rules = []
+  for index, col_type in enumerate(column_types):
+    col_type = col_type.upper().strip()
+    if barcode_flags and barcode_flags[index]:
+      rules.append(('gtin', None))
+    elif not col_type:
+      rules.append(None)
+    elif col_type.startswith('VARCHAR('):
+      rules.append(('chars', int(col_type.split('(')[1].split(')')[0])))
+    elif col_type.split()[0] in _TEXT_TYPE_LIMITS:
+      rules.append(('bytes', _TEXT_TYPE_LIMITS[col_type.split()[0]]))
+    else:
+      rules.append(None)
+  return rules
+
+# truncate a row's values to fit their columns, per _compile_truncation_rules.
+# Raises ValueError for an invalid barcode in a 'gtin' column.
+def _truncate_values(values, rules):
+  for index, rule in enumerate(rules):
+    if rule is None:
+      continue
+    kind, limit = rule
+    value = values[index]
+    if kind == 'gtin':
+      if value is not None:
+        key = canonical_gtin(value)
+        if key is None:
+          raise ValueError(f"invalid barcode {value!r}")
+        values[index] = str(key)
+    elif kind == 'chars':
+      if len(value) > limit:
+        values[index] = value[:limit]
+    elif len(value) > limit // 4: # UTF-8 is at most 4 bytes a character, so shorter values always fit
+      value_bytes = value.encode('utf-8')
+      if len(value_bytes) > limit:
+        values[index] = value_bytes[:limit].decode('utf-8', errors='ignore')
+  return values
+
+# size of the byte ranges handed to each parser process by the parallel TSV import
+_PARALLEL_RANGE_BYTES = 32 * 1024 * 1024
+
+# split a file from 'start' into (start, end) byte ranges of about 'range_bytes',
+# each ending on a line boundary
+def _split_line_ranges(filename, start, range_bytes):
+  import os
+  size = os.path.getsize(filename)
+  ranges = []
+  with open(filename, 'rb') as f:
+    while start < size:
+      f.seek(min(start + range_bytes, size))
+      f.readline() # move on to the end of the line the cut landed in
+      end = min(f.tell(), size)
+      ranges.append((start, end))
+      start = end
+  return ranges
+
+# process pool worker for the parallel TSV import: parse one byte range into
+# truncated row tuples. Returns (rows, malformed_count).
+def _parse_tsv_range(filename, start, end, indices_to_extract, truncation_rules):
+  import csv
+  import io
+  import sys
+
+  # spawned processes don't inherit the parent's raised CSV field size limit
+  max_int = sys.maxsize
+  while True:
+    try:
+      csv.field_size_limit(max_int)
+      break
+    except OverflowError:
+      max_int //= 2
+
+  with open(filename, 'rb') as f:
+    f.seek(start)
+    data = f.read(end - start)
+
+  rows = []
+  malformed = 0
+
+  # decoded line by line, so a line that isn't valid UTF-8 is counted as malformed
+  # instead of being imported with replacement characters
+  def lines():
+    nonlocal malformed
+    for raw_line in io.BytesIO(data):
+      try:
+        yield raw_line.decode('utf-8')
+      except UnicodeDecodeError:
+        malformed += 1
+
+  for row in csv.reader(lines(), delimiter='\t'):
+    if not row:
+      continue
+    try:
+      rows.append(tuple(_truncate_values([row[index] for index in indices_to_extract], truncation_rules)))
+    except (IndexError, ValueError):
+      malformed += 1
+  return rows, malformed
+
+# generator for import_csv: group CSV rows into insert batches as they are read,
+# skipping rows of the wrong width and turning '' into NULL where 'nullable'.
+# Optional _compile_truncation_rules-style 'rules' canonicalize barcode columns;
+# rows with an invalid barcode are skipped.
+def _csv_batches(rows, header, nullable, batch_size, counts, rules=None):
+  batch = []
+  for row in rows:
+    # Basic validation: ensure row has the expected number of columns
+    if len(row) != len(header):
+      print(f"Warning: Skipping row due to column count mismatch: {row}")
+      counts["rows_skipped"] += 1
+      continue
+    values = [None if value == '' and nullable[i] else value for i, value in enumerate(row)]
+    if rules:
+      try:
+        _truncate_values(values, rules)
+      except ValueError:
+        counts["rows_skipped"] += 1
+        continue
+    batch.append(tuple(values))
+    if len(batch) >= batch_size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+# pick a MySQL type for each CSV column that every one of its values fits, in one
+# pass over the rows. A barcode column whose values are all valid GTINs becomes BIGINT
+def _infer_column_types(header, rows, barcode_columns=()):
+  import re
+  integer = re.compile(r'-?(0|[1-9][0-9]*)$') # no leading zeros: barcodes and zip codes stay text
+  decimal = re.compile(r'-?(0|[1-9][0-9]*)?\.[0-9]+([eE][-+]?[0-9]+)?$')
+  date = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2}$')
+
+  width = len(header)
+  seen = [False] * width
+  is_int, is_number, is_date = [True] * width, [True] * width, [True] * width
+  is_gtin = [col.lower() in barcode_columns for col in header]
+  low, high, longest = [0] * width, [0] * width, [0] * width
+  for row in rows:
+    if len(row) != width:
+      continue # skipped by the import
+    for i, value in enumerate(row):
+      if value == '':
+        continue
+      seen[i] = True
+      longest[i] = max(longest[i], len(value))
+      if is_int[i]:
+        if integer.match(value):
+          number = int(value)
+          low[i], high[i] = min(low[i], number), max(high[i], number)
+        else:
+          is_int[i] = False
+      if is_number[i] and not is_int[i] and not decimal.match(value) and not integer.match(value):
+        is_number[i] = False
+      if is_date[i] and not date.match(value):
+        is_date[i] = False
+      if is_gtin[i] and canonical_gtin(value) is None:
+        is_gtin[i] = False
+
+  types = []
+  for i in range(width):
+    if seen[i] and is_gtin[i]:
+      types.append("BIGINT")
+    elif seen[i] and is_int[i] and -2147483648 <= low[i] and high[i] <= 2147483647:
+      types.append("INT")
+    elif seen[i] and is_int[i] and -9223372036854775808 <= low[i] and high[i] <= 9223372036854775807:
+      types.append("BIGINT")
+    elif seen[i] and is_number[i] and not is_int[i]:
+      types.append("DOUBLE")
+    elif seen[i] and is_date[i]:
+      types.append("DATE")
+    elif longest[i] > 255:
+      types.append("TEXT")
+    else:
+      types.append("VARCHAR(255)")
+  return types
+
+# checkpoint of an interrupted import_large_tsv: where to pick up reading and the counts so far
+def _read_checkpoint(checkpoint_file):
+  import json
+  import os
+  if not os.path.exists(checkpoint_file):
+    return None
+  try:
+    with open(checkpoint_file, 'r', encoding='utf-8') as f:
+      return json.load(f)
+  except (OSError, ValueError) as e:
+    print(f"Warning: Ignoring unreadable checkpoint '{checkpoint_file}': {e}")
+    return None
+
+# written to a temporary file and renamed over the old one, so a crash mid-write
+# can't leave a torn checkpoint behind
+def _write_checkpoint(checkpoint_file, offset, rows, rows_loaded, rows_malformed):
+  import json
+  import os
+  temp_file = checkpoint_file + ".tmp"
+  with open(temp_file, 'w', encoding='utf-8') as f:
+    json.dump({"offset": offset, "rows": rows, "rows_loaded": rows_loaded, "rows_malformed": rows_malformed}, f)
+  os.replace(temp_file, checkpoint_file)
+
+# information_schema text can come back as bytes depending on the server version
+def _as_str(value):
+  if isinstance(value, (bytes, bytearray)):
+    return value.decode('utf-8')
+  return value
+
 def clean_str_arr(strings, chars_to_remove):
   modified_strings = tuple(
     ''.join(c for c in s if c not in chars_to_remove) for s in strings
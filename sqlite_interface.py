@@ -0,0 +1,292 @@
+#SQLITE STAND-IN
+#
+# An SQLInterface backed by an SQLite file instead of a MySQL server, so the
+# benchmarks (and quick experiments) run on a machine without one. The MySQL
+# the interface speaks is rewritten statement by statement: %s placeholders,
+# INSERT IGNORE, SHOW TABLES, secondary KEYs inside CREATE TABLE, ORDER BY
+# BINARY, FOR UPDATE, and ON DUPLICATE KEY UPDATE (as ON CONFLICT on the table's
+# primary key). Table metadata comes from PRAGMA table_info instead of
+# information_schema. LOAD DATA is refused, so imports take their INSERT path.
+import functools
+import queue
+import re
+import sqlite3
+import threading
+
+from mysql.connector import errors
+
+from sql_interface import SCHEMA_REFRESH_INTERVAL, SQLInterface, _uses_connection
+
+# (pattern, replacement) applied in order to every statement
+_REWRITES = (
+  (re.compile(r"%s"), "?"),
+  (re.compile(r"^\s*INSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+  (re.compile(r"^\s*SHOW\s+TABLES\s*;?\s*$", re.I),
+   "SELECT name FROM sqlite_master WHERE type = 'table' AND substr(name, 1, 7) != 'sqlite_' ORDER BY name"),
+  (re.compile(r"\bORDER\s+BY\s+BINARY\s+", re.I), "ORDER BY "),
+  (re.compile(r"\s+FOR\s+UPDATE\s*(;?)\s*$", re.I), r"\1"), # a write transaction locks the whole file anyway
+)
+# secondary indexes declared inside CREATE TABLE, which SQLite only accepts as CREATE INDEX
+_INLINE_KEY = re.compile(r",\s*(?:UNIQUE\s+)?(?:KEY|INDEX)\s*(?:`?\w+`?\s*)?\([^)]*\)", re.I)
+_LOAD_DATA = re.compile(r"^\s*LOAD\s+DATA\b", re.I)
+_UPSERT_TABLE = re.compile(r"^\s*INSERT\s+INTO\s+`?(\w+)`?", re.I)
+_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I)
+_VALUES_OF = re.compile(r"\bVALUES\s*\(\s*(`?\w+`?)\s*\)", re.I)
+
+# the SQLite form of a MySQL statement; cached, as the same few statements run over and over
+@functools.lru_cache(maxsize=1024)
+def _translate(sql):
+  if _LOAD_DATA.match(sql):
+    raise errors.NotSupportedError(msg="LOAD DATA is not available on SQLite")
+  for pattern, replacement in _REWRITES:
+    sql = pattern.sub(replacement, sql)
+  if re.match(r"^\s*CREATE\s+TABLE\b", sql, re.I):
+    sql = _INLINE_KEY.sub("", sql)
+  return sql
+
+# the mysql.connector exception matching an sqlite3 one, so callers' 'except Error' still applies
+def _mysql_error(e):
+  if isinstance(e, sqlite3.IntegrityError):
+    return errors.IntegrityError(msg=str(e))
+  if isinstance(e, sqlite3.OperationalError):
+    return errors.OperationalError(msg=str(e))
+  return errors.DatabaseError(msg=str(e))
+
+class _Cursor():
+  def __init__(self, conn):
+    self._cursor = conn.cursor()
+
+  @property
+  def description(self):
+    return self._cursor.description
+
+  @property
+  def rowcount(self):
+    return self._cursor.rowcount
+
+  def execute(self, sql, params=()):
+    try:
+      self._cursor.execute(self._upsert(_translate(sql)), tuple(params or ()))
+    except sqlite3.Error as e:
+      raise _mysql_error(e) from e
+
+  def executemany(self, sql, seq_params):
+    try:
+      self._cursor.executemany(self._upsert(_translate(sql)), seq_params)
+    except sqlite3.Error as e:
+      raise _mysql_error(e) from e
+
+  # 'INSERT ... ON DUPLICATE KEY UPDATE col = VALUES(col)' as SQLite's
+  # 'ON CONFLICT(primary key) DO UPDATE SET col = excluded.col'; the key is read
+  # from the schema, so this can't be one of the cached rewrites
+  def _upsert(self, sql):
+    table = _UPSERT_TABLE.match(sql)
+    if table is None or not _ON_DUPLICATE.search(sql):
+      return sql
+    self._cursor.execute(f"PRAGMA table_info(`{table.group(1)}`)")
+    key = [row[1] for row in sorted(self._cursor.fetchall(), key=lambda row: row[5]) if row[5] > 0]
+    head, assignments = _ON_DUPLICATE.split(sql, 1)
+    assignments = _VALUES_OF.sub(r"excluded.\1", assignments)
+    target = "(" + ", ".join(f"`{column}`" for column in key) + ")" if key else ""
+    return f"{head}ON CONFLICT{target} DO UPDATE SET{assignments}"
+
+  def fetchone(self):
+    return self._cursor.fetchone()
+
+  def fetchmany(self, size=1):
+    return self._cursor.fetchmany(size)
+
+  def fetchall(self):
+    return self._cursor.fetchall()
+
+  def close(self):
+    self._cursor.close()
+
+class _Connection():
+  # results are read lazily off the statement, so there is never an unread result to drain
+  unread_result = False
+
+  def __init__(self, path):
+    self.connection_id = id(self) # stands in for the server's session id
+    try:
+      self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+      # readers don't block the writer (and vice versa) across pooled connections
+      self._conn.execute("PRAGMA journal_mode=WAL")
+      self._conn.execute("PRAGMA synchronous=NORMAL")
+    except sqlite3.Error as e:
+      raise _mysql_error(e) from e
+
+  # every cursor streams; 'prepared' maps onto sqlite3's per-connection statement cache
+  def cursor(self, buffered=None, prepared=False):
+    return _Cursor(self._conn)
+
+  @property
+  def in_transaction(self):
+    return self._conn.in_transaction
+
+  def commit(self):
+    try:
+      self._conn.commit()
+    except sqlite3.Error as e:
+      raise _mysql_error(e) from e
+
+  def rollback(self):
+    try:
+      self._conn.rollback()
+    except sqlite3.Error as e:
+      raise _mysql_error(e) from e
+
+  def is_connected(self):
+    return True
+
+  def ping(self, reconnect=False, attempts=1, delay=0):
+    pass
+
+  def consume_results(self):
+    pass
+
+  def close(self):
+    self._conn.close()
+
+  disconnect = close
+
+# a checked out connection; close() hands it back, as with mysql.connector's PooledMySQLConnection
+class _PooledConnection():
+  def __init__(self, pool, cnx):
+    self._pool = pool
+    self._cnx = cnx
+
+  def __getattr__(self, name):
+    return getattr(self._cnx, name)
+
+  def close(self):
+    self._pool._put(self._cnx)
+
+class _Pool():
+  def __init__(self, path, size):
+    self._idle = queue.LifoQueue()
+    for _ in range(size):
+      self._idle.put(_Connection(path))
+
+  def get_connection(self):
+    try:
+      return _PooledConnection(self, self._idle.get_nowait())
+    except queue.Empty:
+      raise errors.PoolError(msg="Failed getting connection; pool exhausted")
+
+  def _put(self, cnx):
+    self._idle.put(cnx)
+
+class SQLiteInterface(SQLInterface):
+  def __init__(self, path, pool_size=None, pool_timeout=30, schema_refresh_interval=SCHEMA_REFRESH_INTERVAL,
+               barcode_columns=("code", "Barcode"), prepared_statements=False):
+    """
+    Args:
+        path (str): The SQLite database file, created if missing.
+
+    The other arguments are as for SQLInterface. With 'pool_size' every pooled
+    connection opens the same file, so the interface can be shared between
+    request threads as it would be against MySQL.
+    """
+    super().__init__("sqlite", path, None, None, pool_size=pool_size, pool_timeout=pool_timeout,
+                     schema_refresh_interval=schema_refresh_interval, barcode_columns=barcode_columns,
+                     prepared_statements=prepared_statements)
+    self.path = path
+
+  def connect(self):
+    try:
+      self.db = _Connection(self.path)
+      self.cursor = self.db.cursor()
+      print(f"Using SQLite database '{self.path}'")
+      if self.pool_size:
+        self._create_pool()
+    except errors.Error as e:
+      print(f"There was a problem opening the database: {e}")
+
+  def _create_pool(self):
+    self.pool = _Pool(self.path, self.pool_size)
+    self._pool_slots = threading.BoundedSemaphore(self.pool_size)
+    self._cursor.close()
+    self._db.close()
+    self._cursor = None
+    self._db = None
+    print(f"Opened a pool of {self.pool_size} connections to '{self.path}'")
+
+  # as SQLInterface._worker_interfaces, with new connections opening the same file
+  def _worker_interfaces(self, count):
+    if self.pool is not None and self.pool_size > count:
+      return [self] * count
+    interfaces = []
+    for _ in range(count):
+      worker = SQLiteInterface(self.path)
+      worker.connect()
+      interfaces.append(worker)
+    return interfaces
+
+  @_uses_connection
+  def refresh_schema(self, tablename=None):
+    """
+    Reloads the cached table/column metadata from sqlite_master and PRAGMA table_info.
+
+    Args:
+        tablename (str, optional): Reload just this table. Defaults to None (all tables).
+    """
+    if not self.cursor:
+      print("Error: Not connected to database. Call .connect() first.")
+      return
+
+    if tablename is not None and self._schema is None:
+      tablename = None # nothing cached yet, so load everything
+
+    try:
+      if tablename is None:
+        self.cursor.execute("SHOW TABLES")
+        names = [row[0] for row in self.cursor.fetchall()]
+      else:
+        tablename = tablename.strip('`')
+        names = [tablename]
+
+      tables = {}
+      for name in names:
+        self.cursor.execute(f"PRAGMA table_info(`{name}`)")
+        column_rows = self.cursor.fetchall()
+        if not column_rows:
+          continue # no such table
+        info = tables[name] = {"columns": [], "types": {}, "primary_key": [], "by_lower": {}}
+        for _, column, column_type, _, _, key_position in column_rows:
+          info["columns"].append(column)
+          info["types"][column] = column_type
+          info["by_lower"][column.lower()] = column
+        info["primary_key"] = [row[1] for row in sorted(column_rows, key=lambda row: row[5]) if row[5] > 0]
+    except errors.Error as e:
+      print(f"Error loading table metadata: {e}")
+      return
+
+    self._store_schema(tablename, tables)
+
+  @_uses_connection
+  def ensure_index(self, tablename, column_name):
+    """
+    Creates an index on a column unless it already has one, as SQLInterface.ensure_index.
+
+    Returns:
+        bool: True if the column is indexed, False if an error occurred.
+    """
+    if not self.cursor:
+      print("Error: Not connected to database. Call .connect() first.")
+      return False
+
+    column = self._column_name(tablename, column_name)
+    if column is None:
+      print(f"Error: Column '{column_name}' does not exist in table '{tablename}'.")
+      return False
+    tablename = tablename.strip('`')
+
+    try:
+      # index names are global in SQLite, so the table is part of the name
+      self.cursor.execute(f"CREATE INDEX IF NOT EXISTS `idx_{tablename}_{column}` ON `{tablename}` (`{column}`)")
+      self.db.commit()
+      return True
+    except errors.Error as e:
+      print(f"Error creating index on '{tablename}.{column}': {e}")
+      return False
@@ -0,0 +1,121 @@
+#IN-MEMORY STORE COVERAGE
+import threading
+import time
+
+class StoreCoverage():
+  def __init__(self):
+    """
+    Every store's approved barcodes held in memory, so coverage checks don't
+    touch the database.
+
+    Each store gets a bit; a barcode maps to the bitmask of the stores that
+    approve it, which answers "which stores cover this barcode" with one dict
+    lookup. Per-store name tables are replaced whole on reload and patched one
+    barcode at a time by set_approval(), so readers of get_store() should only
+    look single barcodes up in them, not iterate them.
+    """
+    self._names = {} # storeid -> {barcode: name}
+    self._loaded_at = {} # storeid -> time.monotonic() of its last full load
+    self._slots = {} # storeid -> bit number, in load order
+    self._members = {} # barcode -> bitmask of the stores approving it
+    self._lock = threading.Lock()
+
+  def load_store(self, storeid, names):
+    """
+    Replaces one store's approval list.
+
+    Args:
+        storeid (str): The store.
+        names (dict): Barcode -> product name. Barcodes with no name are treated
+                      as not approved, like a covered? query that finds no name.
+    """
+    names = {barcode: name for barcode, name in names.items() if name is not None}
+    with self._lock:
+      bit = 1 << self._slots.setdefault(storeid, len(self._slots))
+      self._clear_bits(storeid, bit)
+      for barcode in names:
+        self._members[barcode] = self._members.get(barcode, 0) | bit
+      self._names[storeid] = names
+      self._loaded_at[storeid] = time.monotonic()
+
+  def set_approval(self, storeid, barcode, name):
+    """
+    Patches one barcode of a loaded store's list: approves it under 'name', or
+    withdraws it if 'name' is None. Does nothing if the store isn't loaded.
+    """
+    with self._lock:
+      names = self._names.get(storeid)
+      if names is None:
+        return
+      bit = 1 << self._slots[storeid]
+      if name is not None:
+        names[barcode] = name
+        self._members[barcode] = self._members.get(barcode, 0) | bit
+      elif names.pop(barcode, None) is not None:
+        remaining = self._members[barcode] & ~bit
+        if remaining:
+          self._members[barcode] = remaining
+        else:
+          del self._members[barcode]
+
+  def stale_stores(self, max_age):
+    """
+    Returns:
+        list: The loaded stores whose list was last loaded in full more than
+              'max_age' seconds ago, oldest first.
+    """
+    cutoff = time.monotonic() - max_age
+    with self._lock:
+      return sorted((storeid for storeid in self._names if self._loaded_at[storeid] < cutoff),
+                    key=self._loaded_at.get)
+
+  def drop_store(self, storeid):
+    """
+    Forgets a store's list; until it is loaded again get_store() returns None
+    and callers go back to the database.
+    """
+    with self._lock:
+      if storeid in self._slots:
+        self._clear_bits(storeid, 1 << self._slots[storeid])
+        self._names.pop(storeid, None)
+        self._loaded_at.pop(storeid, None)
+
+  # caller holds the lock
+  def _clear_bits(self, storeid, bit):
+    for barcode in self._names.get(storeid, ()):
+      remaining = self._members[barcode] & ~bit
+      if remaining:
+        self._members[barcode] = remaining
+      else:
+        del self._members[barcode]
+
+  def get_store(self, storeid):
+    """
+    Returns:
+        dict: The store's barcode -> name table (do not modify it), or None if
+              the store isn't loaded.
+    """
+    return self._names.get(storeid)
+
+  def stores_covering(self, barcode):
+    """
+    Returns:
+        list: (storeid, name) for every loaded store that approves the barcode,
+              in the order the stores were loaded.
+    """
+    with self._lock:
+      mask = self._members.get(barcode, 0)
+      return [(storeid, self._names[storeid][barcode]) for storeid, slot in self._slots.items()
+              if mask >> slot & 1]
+
+  def loaded_stores(self):
+    with self._lock:
+      return [storeid for storeid in self._slots if storeid in self._names]
+
+  def stats(self):
+    with self._lock:
+      return {
+        "stores": len(self._names),
+        "barcodes": len(self._members),
+        "approvals": sum(len(names) for names in self._names.values())
+      }